@@ -0,0 +1,96 @@
+from typing import Callable, Tuple
+import numpy as np
+
+from abm1559.utils import constants
+from abm1559.basefee import user1559_gas_used
+
+###
+# EIP 1559 as an AMM curve, where the ETH burnt for `gas` units past `excess_gas_issued` is
+# `eth_qty(excess_gas_issued + gas) - eth_qty(excess_gas_issued)` with `eth_qty(x) = exp(x / TARGET_GAS_USED / BASEFEE_MAX_CHANGE_DENOMINATOR)`
+# https://ethresear.ch/t/make-eip-1559-more-like-an-amm-curve/9082
+#
+# Quantities are computed in log space, `exp` of the excess gas is never taken on its own,
+# so that they remain accurate when the excess gas issued grows large in long runs.
+###
+
+def amm_rate(config=None) -> float:
+    """
+    Exponent of the curve per unit of gas, `1 / (TARGET_GAS_USED * BASEFEE_MAX_CHANGE_DENOMINATOR)`.
+    """
+    config = constants if config is None else config
+    return 1.0 / (config["TARGET_GAS_USED"] * config["BASEFEE_MAX_CHANGE_DENOMINATOR"])
+
+def log_burn(excess_gas_issued, gas_used, config=None):
+    """
+    Log of the ETH burnt by a block using `gas_used` past `excess_gas_issued`, `a * excess + log(expm1(a * gas_used))`. Works on scalars and arrays; is `-inf` for empty blocks.
+    """
+    a = amm_rate(config)
+    with np.errstate(divide="ignore"):
+        return a * np.asarray(excess_gas_issued, dtype=np.float64) + np.log(np.expm1(a * np.asarray(gas_used, dtype=np.float64)))
+
+def implied_basefee(excess_gas_issued, gas_used, config=None):
+    """
+    Basefee implied by a block using `gas_used` past `excess_gas_issued`, i.e., its burn divided by `gas_used`, or 0 for empty blocks.
+    """
+    gas_used = np.asarray(gas_used, dtype=np.float64)
+    # Overflows to `inf` only when the basefee itself exceeds the float range
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        basefee = np.exp(log_burn(excess_gas_issued, gas_used, config) - np.log(gas_used))
+    basefee = np.where(gas_used > 0, basefee, 0.0)
+    return basefee.item() if basefee.ndim == 0 else basefee
+
+def marginal_basefee(excess_gas_issued, config=None):
+    """
+    Price of the next unit of gas, `eth_qty(excess_gas_issued) / (TARGET_GAS_USED * BASEFEE_MAX_CHANGE_DENOMINATOR)`.
+    """
+    a = amm_rate(config)
+    basefee = np.exp(a * np.asarray(excess_gas_issued, dtype=np.float64) + np.log(a))
+    return basefee.item() if basefee.ndim == 0 else basefee
+
+def excess_gas_for_basefee(basefee, config=None):
+    """
+    Excess gas issued at which the marginal basefee is `basefee`, the inverse of :py:func:`abm1559.amm.marginal_basefee`.
+    """
+    a = amm_rate(config)
+    return np.maximum(0.0, (np.log(basefee) - np.log(a)) / a)
+
+def update_excess_gas(excess_gas_issued, gas_used, config=None):
+    """
+    Excess gas issued after a block using `gas_used`, `max(0, excess_gas_issued + gas_used - TARGET_GAS_USED)`. Works on scalars and arrays.
+    """
+    config = constants if config is None else config
+    return np.maximum(0, excess_gas_issued + gas_used - config["TARGET_GAS_USED"])
+
+def simulate_amm_paths(demand: np.ndarray, gas_used_fn: Callable = user1559_gas_used, initial_excess_gas: float = None, config=None, rng: np.random.Generator = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Advances the AMM of all paths in lockstep, the counterpart of :py:func:`abm1559.basefee.simulate_basefee_paths` to compare both designs over the same demand. Users see the marginal basefee.
+
+    Args:
+        demand (np.ndarray): Demand of shape `(paths, blocks)`, or gas used directly when `gas_used_fn` is `None`
+        gas_used_fn (Callable): Called with `(demand[:, t], basefee, config=config, rng=rng)`, returns the gas used by block `t` of each path
+        initial_excess_gas (float): Defaults to the excess gas at which the marginal basefee is `INITIAL_BASEFEE`
+        config (Config): Protocol constants, defaults to :py:data:`abm1559.utils.constants`
+        rng (np.random.Generator): Passed to `gas_used_fn`
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Excess gas issued and marginal basefees of shape `(paths, blocks + 1)`, and basefees implied by each block of shape `(paths, blocks)`
+    """
+
+    config = constants if config is None else config
+    demand = np.atleast_2d(demand)
+    paths, blocks = demand.shape
+    if initial_excess_gas is None:
+        initial_excess_gas = excess_gas_for_basefee(config["INITIAL_BASEFEE"], config)
+
+    excess = np.empty((paths, blocks + 1))
+    excess[:, 0] = initial_excess_gas
+    implied = np.empty((paths, blocks))
+    for t in range(blocks):
+        if gas_used_fn is None:
+            gas_used = demand[:, t]
+        else:
+            gas_used = gas_used_fn(demand[:, t], marginal_basefee(excess[:, t], config), config=config, rng=rng)
+        implied[:, t] = implied_basefee(excess[:, t], gas_used, config)
+        excess[:, t + 1] = update_excess_gas(excess[:, t], gas_used, config)
+
+    return excess, marginal_basefee(excess, config), implied
@@ -0,0 +1,100 @@
+from typing import Callable, Tuple
+import numpy as np
+
+from abm1559.utils import constants
+
+###
+# Basefee dynamics over many paths at once, to screen scenarios before running the agent-based simulation
+###
+
+def update_basefee_paths(basefee: np.ndarray, gas_used: np.ndarray, config=None) -> np.ndarray:
+    """
+    Vectorized :py:func:`abm1559.simulator.update_basefee`: the same update rule, with the same integer semantics (floor divisions, increases of at least 1 wei), applied to arrays of basefees and gas used.
+
+    Args:
+        basefee (np.ndarray): Current basefees, in wei
+        gas_used (np.ndarray): Gas used by the previous block of each path
+        config (Config): Protocol constants, defaults to :py:data:`abm1559.utils.constants`
+
+    Returns:
+        np.ndarray: The new basefees, as `np.int64`
+    """
+
+    config = constants if config is None else config
+    target = config["TARGET_GAS_USED"]
+    quotient = target * config["BASEFEE_MAX_CHANGE_DENOMINATOR"]
+
+    basefee = np.asarray(basefee).astype(np.int64)
+    gas_delta = np.asarray(gas_used).astype(np.int64) - target
+    abs_delta = np.abs(gas_delta)
+
+    # basefee * gas_delta // target // denominator, split so that the product never overflows int64
+    fee_delta = (basefee // quotient) * abs_delta + (basefee % quotient) * abs_delta // quotient
+
+    return np.where(
+        gas_delta > 0,
+        basefee + np.maximum(fee_delta, 1),
+        basefee - fee_delta,
+    )
+
+def user1559_gas_used(demand: np.ndarray, basefee: np.ndarray, config=None, gas_premium: float = 1 * (10 ** 9), rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Gas used by a block when `demand` new :py:class:`abm1559.users.User1559` arrive, a fluid approximation ignoring the transaction pool.
+
+    A user with value :math:`v \\sim U(0, 20)` Gwei and cost :math:`c \\sim U(0, 1)` Gwei per block transacts when :math:`v - 5c > basefee + premium`. With :math:`a = 20 - (basefee + premium)` in Gwei, this happens with probability :math:`(a - 2.5) / 20` when :math:`a \\geq 5` and :math:`a^2 / 200` when :math:`0 < a < 5`.
+
+    Args:
+        demand (np.ndarray): Expected number of new users in each path
+        basefee (np.ndarray): Current basefee of each path, in wei
+        gas_premium (float): Premium set by users, in wei
+        rng (np.random.Generator): If given, the number of users and of transacting users are drawn (Poisson and binomial) instead of taken in expectation
+
+    Returns:
+        np.ndarray: Gas used in each path, at most `MAX_GAS_EIP1559`
+    """
+
+    config = constants if config is None else config
+    a = 20 - (np.asarray(basefee) + gas_premium) / (10 ** 9)
+    p = np.where(a >= 5, (a - 2.5) / 20, np.where(a > 0, a ** 2 / 200, 0.0))
+
+    if rng is None:
+        txs = np.asarray(demand) * p
+    else:
+        txs = rng.binomial(rng.poisson(np.maximum(demand, 0)), p)
+
+    max_txs = config["MAX_GAS_EIP1559"] // config["SIMPLE_TRANSACTION_GAS"]
+    return np.minimum(np.floor(txs), max_txs).astype(np.int64) * config["SIMPLE_TRANSACTION_GAS"]
+
+def simulate_basefee_paths(demand: np.ndarray, gas_used_fn: Callable = user1559_gas_used, initial_basefee: int = None, config=None, rng: np.random.Generator = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Advances the basefee of all paths in lockstep, e.g., over demand paths from :py:func:`abm1559.simulator.generate_gbm`.
+
+    Args:
+        demand (np.ndarray): Demand of shape `(paths, blocks)`, or gas used directly when `gas_used_fn` is `None`
+        gas_used_fn (Callable): Called with `(demand[:, t], basefee, config=config, rng=rng)`, returns the gas used by block `t` of each path
+        initial_basefee (int): Defaults to `INITIAL_BASEFEE`
+        config (Config): Protocol constants, defaults to :py:data:`abm1559.utils.constants`
+        rng (np.random.Generator): Passed to `gas_used_fn`
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Basefees of shape `(paths, blocks + 1)`, starting with the initial basefee, and gas used of shape `(paths, blocks)`
+    """
+
+    config = constants if config is None else config
+    demand = np.atleast_2d(demand)
+    paths, blocks = demand.shape
+    initial_basefee = config["INITIAL_BASEFEE"] if initial_basefee is None else initial_basefee
+
+    basefees = np.empty((paths, blocks + 1), dtype=np.int64)
+    basefees[:, 0] = initial_basefee
+    if gas_used_fn is None:
+        gas_used = np.asarray(demand, dtype=np.int64)
+    else:
+        gas_used = np.empty((paths, blocks), dtype=np.int64)
+
+    for t in range(blocks):
+        if not gas_used_fn is None:
+            gas_used[:, t] = gas_used_fn(demand[:, t], basefees[:, t], config=config, rng=rng)
+        basefees[:, t + 1] = update_basefee_paths(basefees[:, t], gas_used[:, t], config=config)
+
+    return basefees, gas_used
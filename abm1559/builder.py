@@ -0,0 +1,117 @@
+from typing import Sequence, Iterable, Tuple, Iterator
+import numpy as np
+
+from abm1559.config import rng
+from abm1559.utils import constants
+
+###
+# Block building by gas used
+###
+
+def by_tip(txs: Iterable, env, rng: np.random.Generator = rng) -> Iterator[Tuple[float, object]]:
+    """
+    Valid transactions of `txs` with their tip, by decreasing tip with ties in random order. Sorts `txs`, pools indexed by tip provide their own order (e.g., :py:meth:`abm1559.txpool.IndexedTxPool.iter_by_tip`).
+    """
+    valid_txs = [tx for tx in txs if tx.is_valid(env)]
+    rng.shuffle(valid_txs)
+    candidates = [(tx.tip(env), tx) for tx in valid_txs]
+    candidates.sort(key = lambda candidate: -candidate[0])
+    return iter(candidates)
+
+def _knapsack(candidates: Sequence[Tuple[float, object]], gas_limit: int, resolution: int) -> Sequence[int]:
+    # Indices of the candidates maximizing the sum of `tip * gas_used` within `gas_limit`
+    # Gas is counted in units of `resolution`, rounded up so that the solution always fits
+    cells = gas_limit // resolution
+    weights = [-(-tx.gas_used // resolution) for _, tx in candidates]
+    values = [tip * tx.gas_used for tip, tx in candidates]
+
+    best = np.zeros(cells + 1)
+    taken = np.zeros((len(candidates), cells + 1), dtype=bool)
+    for i, (weight, value) in enumerate(zip(weights, values)):
+        if weight > cells:
+            continue
+        with_item = best[:cells + 1 - weight] + value
+        improved = with_item > best[weight:]
+        taken[i, weight:] = improved
+        best[weight:] = np.where(improved, with_item, best[weight:])
+
+    chosen = []
+    cell = cells
+    for i in range(len(candidates) - 1, -1, -1):
+        if taken[i, cell]:
+            chosen.append(i)
+            cell -= weights[i]
+    return chosen[::-1]
+
+def pack(
+    candidates: Iterable[Tuple[float, object]], gas_limit: int = None, per_tx_gaslimit: int = None,
+    min_gas: int = None, knapsack_window: int = 0, knapsack_cells: int = 2000, config=None,
+) -> Sequence:
+    """
+    Packs transactions into a block by their actual `gas_used`.
+
+    Candidates are taken greedily by decreasing tip while they fit in the remaining gas, skipping those which do not fit and those above the per-transaction gas limit, until less than `min_gas` remains. Since the tip is paid per unit of gas, this is the greedy fill by value density. When no remaining candidate fits, all of them are scanned.
+
+    With `knapsack_window` set, the transactions around the first candidate which did not fit (up to `knapsack_window` before and after it) are then chosen again by a 0/1 knapsack maximizing the total tips `tip * gas_used`, the remaining gas being filled greedily again. The knapsack solution is kept if it pays more. It counts gas in `knapsack_cells` units of the available gas, rounded up, and costs O(knapsack_window * knapsack_cells).
+
+    Args:
+        candidates (Iterable[Tuple[float, Transaction]]): Pairs `(tip, tx)` by decreasing tip, e.g., from :py:func:`abm1559.builder.by_tip`
+        gas_limit (int): Block gas limit, defaults to `MAX_GAS_EIP1559`
+        per_tx_gaslimit (int): Transaction gas limit, defaults to `PER_TX_GASLIMIT`
+        min_gas (int): Smallest gas used by a transaction, defaults to `SIMPLE_TRANSACTION_GAS`
+        knapsack_window (int): Number of transactions on each side of the greedy boundary chosen again by knapsack
+        knapsack_cells (int): Resolution of the knapsack
+        config (Config): Protocol constants, defaults to :py:data:`abm1559.utils.constants`
+
+    Returns:
+        Sequence[Transaction]: The transactions of the block, by decreasing tip
+    """
+
+    config = constants if config is None else config
+    gas_limit = config["MAX_GAS_EIP1559"] if gas_limit is None else gas_limit
+    per_tx_gaslimit = config["PER_TX_GASLIMIT"] if per_tx_gaslimit is None else per_tx_gaslimit
+    min_gas = config["SIMPLE_TRANSACTION_GAS"] if min_gas is None else min_gas
+
+    # Greedy fill, keeping the candidates seen
+    seen = []
+    selected = []
+    remaining = gas_limit
+    boundary = None
+    for tip, tx in candidates:
+        if tx.gas_used > per_tx_gaslimit:
+            continue
+        seen.append((tip, tx))
+        if tx.gas_used <= remaining:
+            selected.append(len(seen) - 1)
+            remaining -= tx.gas_used
+        elif boundary is None:
+            boundary = len(seen) - 1
+        if remaining < min_gas:
+            if boundary is None or len(seen) >= boundary + knapsack_window + 1:
+                break
+
+    if knapsack_window == 0 or boundary is None:
+        return [seen[i][1] for i in selected]
+
+    # Candidates before the window all fit and are kept
+    start = max(0, boundary - knapsack_window)
+    end = min(len(seen), boundary + knapsack_window + 1)
+    fixed_gas = sum(seen[i][1].gas_used for i in range(start))
+    window = seen[start:end]
+    available = gas_limit - fixed_gas
+    chosen = [start + i for i in _knapsack(window, available, max(1, available // knapsack_cells))]
+
+    # Remaining gas is filled greedily from the candidates after the window
+    remaining = available - sum(seen[i][1].gas_used for i in chosen)
+    for i in range(end, len(seen)):
+        if remaining < min_gas:
+            break
+        if seen[i][1].gas_used <= remaining:
+            chosen.append(i)
+            remaining -= seen[i][1].gas_used
+
+    revenue = lambda indices: sum(seen[i][0] * seen[i][1].gas_used for i in indices)
+    knapsack_selected = list(range(start)) + chosen
+    if revenue(knapsack_selected) > revenue(selected):
+        selected = knapsack_selected
+    return [seen[i][1] for i in selected]
@@ -1,13 +1,19 @@
 import sys
 import math
+from array import array
+from typing import Dict, Callable, Sequence
+import numpy as np
 import pandas as pd
 
 from abm1559.config import rng
 from abm1559.utils import constants
+from abm1559.amm import log_burn, implied_basefee
 
 class Block:
     """
     An abstract block representation.
+
+    Summary statistics of the block are computed in a single pass when it is created (see :py:meth:`summarize`) and served by its methods.
     """
 
     def __init__(self, txs, parent_hash, height, rng=rng):
@@ -15,15 +21,27 @@ class Block:
         self.txs = txs
         self.parent_hash = parent_hash
         self.height = height
+        self.summarize()
 
     def __str__(self):
         return "Block:\n" + "\n".join([tx.__str__() for tx in self.txs])
 
+    def summarize(self):
+        """
+        Computes the summary statistics of the block. Should be called again if `txs` are modified after the block is created.
+        """
+        gas_used = np.fromiter([tx.gas_used for tx in self.txs], dtype=np.int64, count=len(self.txs))
+        start_blocks = np.fromiter([tx.start_block for tx in self.txs], dtype=np.int64, count=len(self.txs))
+        self._summary = {
+            "gas_used": int(gas_used.sum()),
+            "waiting_time": float(self.height * len(self.txs) - start_blocks.sum()),
+        }
+
     def average_waiting_time(self):
-        return 0 if len(self.txs) == 0 else sum([self.height - tx.start_block for tx in self.txs]) / len(self.txs)
+        return 0 if len(self.txs) == 0 else self._summary["waiting_time"] / len(self.txs)
     
     def gas_used(self):
-        return 0 if len(self.txs) == 0 else sum([tx.gas_used for tx in self.txs])
+        return self._summary["gas_used"]
 
 class Block1559(Block):
     """
@@ -31,38 +49,68 @@ class Block1559(Block):
     """
 
     def __init__(self, txs, parent_hash, height, basefee, **kwargs):
-        super().__init__(txs, parent_hash, height, **kwargs)
         self.basefee = basefee
-        
-    def tips(self):
-        return 0 if len(self.txs) == 0 else sum([tx.tip({
+        super().__init__(txs, parent_hash, height, **kwargs)
+
+    def summarize(self):
+        super().summarize()
+
+        if len(self.txs) == 0:
+            self._summary.update({ "tips": 0, "min_tip": 0, "max_tip": 0, "gas_prices": 0, "min_premium": 0, "max_premium": 0 })
+            return
+
+        env = {
             "basefee": self.basefee,
             "current_block": self.height,
-        }) for tx in self.txs]) / (10 ** 9)
+        }
+        tips = np.array([tx.tip(env) for tx in self.txs])
+        gas_prices = np.array([tx.gas_price(env) for tx in self.txs])
+        self._summary.update({
+            "tips": tips.sum().item(),
+            "min_tip": tips.min().item(),
+            "max_tip": tips.max().item(),
+            "gas_prices": gas_prices.sum().item(),
+        })
+
+        # Escalator transactions have no fixed premium
+        if all([hasattr(tx, "gas_premium") for tx in self.txs]):
+            premiums = np.array([tx.gas_premium for tx in self.txs])
+            self._summary.update({
+                "min_premium": premiums.min().item(),
+                "max_premium": premiums.max().item(),
+            })
+
+    def _is_block_env(self, env) -> bool:
+        return env["basefee"] == self.basefee and env.get("current_block", self.height) == self.height
+
+    def tips(self):
+        return self._summary["tips"] / (10 ** 9)
 
     def average_tip(self): # in Gwei
-        return 0 if len(self.txs) == 0 else sum([tx.tip({
-            "basefee": self.basefee,
-            "current_block": self.height,
-        }) for tx in self.txs]) / len(self.txs) / (10 ** 9)
+        return 0 if len(self.txs) == 0 else self._summary["tips"] / len(self.txs) / (10 ** 9)
 
     def average_gas_price(self): # in Gwei
-        return 0 if len(self.txs) == 0 else sum([tx.gas_price({
-            "basefee": self.basefee,
-            "current_block": self.height,
-        }) for tx in self.txs]) / len(self.txs) / (10 ** 9)
+        return 0 if len(self.txs) == 0 else self._summary["gas_prices"] / len(self.txs) / (10 ** 9)
 
     def min_premium(self) -> int: # in wei
-        return 0 if len(self.txs) == 0 else min([tx.gas_premium for tx in self.txs])
+        if "min_premium" in self._summary:
+            return self._summary["min_premium"]
+        return min([tx.gas_premium for tx in self.txs])
     
     def max_premium(self) -> int: # in wei
-        return 0 if len(self.txs) == 0 else max([tx.gas_premium for tx in self.txs])
+        if "max_premium" in self._summary:
+            return self._summary["max_premium"]
+        return max([tx.gas_premium for tx in self.txs])
     
     def min_tip(self, env) -> int:
-        return 0 if len(self.txs) == 0 else min([tx.tip(env) for tx in self.txs])
+        if len(self.txs) == 0 or self._is_block_env(env):
+            return self._summary["min_tip"]
+        return min([tx.tip(env) for tx in self.txs])
     
     def max_tip(self, env) -> int:
-        return 0 if len(self.txs) == 0 else max([tx.tip(env) for tx in self.txs])
+        if len(self.txs) == 0 or self._is_block_env(env):
+            return self._summary["max_tip"]
+        return max([tx.tip(env) for tx in self.txs])
 
     def txs_data(self):
         txs_data = []
@@ -83,31 +131,136 @@ class Block1559(Block):
 # https://ethresear.ch/t/make-eip-1559-more-like-an-amm-curve/9082
 ###
     
-def eth_qty(gas_qty):
-    return math.exp(gas_qty / constants["TARGET_GAS_USED"] / constants["BASEFEE_MAX_CHANGE_DENOMINATOR"])    
+def eth_qty(gas_qty, config=None):
+    config = constants if config is None else config
+    return math.exp(gas_qty / config["TARGET_GAS_USED"] / config["BASEFEE_MAX_CHANGE_DENOMINATOR"])    
 
 class BlockAMMImplied(Block1559):
-    
-    def __init__(self, txs, parent_hash, height, excess_gas_issued, **kwargs):
-        super().__init__(txs, parent_hash, height, basefee = 0, **kwargs)
+    """
+    A block of the AMM design, whose basefee is implied by its gas used past `excess_gas_issued` (see :py:func:`abm1559.amm.implied_basefee`).
+    """
+
+    def __init__(self, txs, parent_hash, height, excess_gas_issued, config=None, **kwargs):
         self.excess_gas_issued = excess_gas_issued
-        self.burn_fee = eth_qty(self.excess_gas_issued + self.gas_used())
-        self.burn_fee = self.burn_fee - eth_qty(self.excess_gas_issued)
-        self.basefee = self.burn_fee / self.gas_used() if self.gas_used() > 0 else 0
-    
+        self._config = config
+        super().__init__(txs, parent_hash, height, basefee = 0, **kwargs)
+
+    def summarize(self):
+        # Fee statistics depend on the basefee implied by the gas used, set first
+        gas_used = sum([tx.gas_used for tx in self.txs])
+        self.burn_fee = float(np.exp(log_burn(self.excess_gas_issued, gas_used, self._config))) if gas_used > 0 else 0.0
+        self.basefee = implied_basefee(self.excess_gas_issued, gas_used, self._config)
+        super().summarize()
+
+def blob_gas_used(block) -> int:
+    # Gas used by transactions whose blob was published (see the sharding notebook)
+    return sum([tx.gas_used for tx in block.txs if getattr(tx, "blob_published", False)])
+
+# Per-block metrics aggregated by :py:class:`abm1559.chain.Chain`
+chain_metrics = {
+    "gas_used": lambda block: block.gas_used(),
+    "blob_gas_used": blob_gas_used,
+    "basefee": lambda block: block.basefee, # in wei
+    "tips": lambda block: block.tips(), # in Gwei
+}
+
 class Chain:
     """
     A container for :py:class:`abm1559.chain.Block` .
+
+    Blocks are indexed by height. For each metric in `metrics` (by default `gas_used`, `blob_gas_used`, `basefee` and `tips`), the chain keeps running totals so that rolling sums and means over any window are available in O(1) (see :py:meth:`rolling_mean`).
+
+    Args:
+        writer (ChainWriter): If given, the transactions of each new block are written out (see :py:class:`abm1559.export.ChainWriter`)
+        retain (int): If given, only the `retain` most recent blocks are kept in memory. Rolling aggregates cover all blocks.
+        metrics (Dict[str, Callable[[Block], float]]): Per-block metrics to aggregate, defaults to :py:data:`abm1559.chain.chain_metrics`
     """
 
-    def __init__(self):
+    def __init__(self, writer=None, retain: int = None, metrics: Dict[str, Callable] = None):
         self.blocks = {}
         self.current_head = (0).to_bytes(8, sys.byteorder)
+        self.writer = writer
+        self.retain = retain
+        self.metrics = chain_metrics if metrics is None else metrics
+
+        # Heights in order of addition, their position and block hash
+        self.heights = []
+        self.positions = {}
+        self.hashes = {}
+        # Running totals of each metric, `totals[name][i]` sums the first `i` blocks
+        self.totals = { name: array("d", [0.0]) for name in self.metrics }
+        # Position from which running totals may have changed since each consumer last read them, by consumer (e.g., `abm1559.checkpoint` and `abm1559.sharding`), 0 for consumers who never did
+        self.modified_from = {}
 
     def add_block(self, block):
         self.blocks[block.block_hash] = block
         self.current_head = block.block_hash
 
+        self.positions[block.height] = len(self.heights)
+        self.heights.append(block.height)
+        self.hashes[block.height] = block.block_hash
+        for name, metric in self.metrics.items():
+            totals = self.totals[name]
+            totals.append(totals[-1] + metric(block))
+
+        if not self.writer is None:
+            self.writer.write_block(block)
+        if not self.retain is None and len(self.blocks) > self.retain:
+            del self.blocks[next(iter(self.blocks))]
+
+    def block_at(self, height: int) -> Block:
+        return self.blocks[self.hashes[height]]
+
+    def head_height(self) -> int:
+        return self.heights[-1]
+
+    def add_to_metric(self, name: str, height: int, delta: float) -> None:
+        """
+        Adds `delta` to the value of metric `name` at `height`, e.g., when a blob is published after its block was added. Costs O(number of blocks since `height`).
+        """
+        totals = self.totals[name]
+        for i in range(self.positions[height] + 1, len(totals)):
+            totals[i] += delta
+        for consumer, position in self.modified_from.items():
+            self.modified_from[consumer] = min(position, self.positions[height] + 1)
+
+    def rolling_sum(self, name: str, window: int, height: int = None) -> float:
+        """
+        Sum of metric `name` over the `window` blocks up to `height` (the head by default), or fewer at the start of the chain.
+        """
+        end = len(self.heights) if height is None else self.positions[height] + 1
+        start = max(0, end - window)
+        totals = self.totals[name]
+        return totals[end] - totals[start]
+
+    def rolling_mean(self, name: str, window: int, height: int = None) -> float:
+        """
+        Mean of metric `name` over the `window` blocks up to `height` (the head by default), or fewer at the start of the chain.
+        """
+        end = len(self.heights) if height is None else self.positions[height] + 1
+        start = max(0, end - window)
+        totals = self.totals[name]
+        return (totals[end] - totals[start]) / (end - start)
+
+    def rolling_series(self, name: str, window: int, mean: bool = True) -> pd.Series:
+        """
+        Rolling mean (or sum) of metric `name` at every height.
+        """
+        totals = np.frombuffer(self.totals[name], dtype=np.float64)
+        end = np.arange(1, len(totals))
+        start = np.maximum(0, end - window)
+        series = totals[end] - totals[start]
+        if mean:
+            series = series / (end - start)
+        return pd.Series(series, index=pd.Index(self.heights, name="block"), name=f"{name}_{window}")
+
+    def export_rolling(self, windows: Sequence[int], names: Sequence[str] = None, mean: bool = True) -> pd.DataFrame:
+        """
+        Rolling means (or sums) of metrics `names` (all by default) for each window in `windows`.
+        """
+        names = self.metrics.keys() if names is None else names
+        return pd.concat([self.rolling_series(name, window, mean=mean) for name in names for window in windows], axis=1)
+
     def export(self):
         df = []
         for block in self.blocks.values():
@@ -0,0 +1,218 @@
+import io
+import os
+import glob
+import pickle
+import zlib
+from itertools import islice
+from collections import defaultdict
+from typing import Dict, Iterator
+
+from abm1559 import config
+
+class _Pickler(pickle.Pickler):
+    # Generators shared by the simulation and its users are stored by reference
+    def __init__(self, file, generators):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.generators = generators
+
+    def persistent_id(self, obj):
+        for name, generator in self.generators.items():
+            if obj is generator:
+                return name
+        return None
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, generators):
+        super().__init__(file)
+        self.generators = generators
+
+    def persistent_load(self, pid):
+        return self.generators[pid]
+
+def _generators(simulation) -> Dict:
+    return { **simulation.generators(), "global_rng": config.rng }
+
+class Checkpointer:
+    """
+    Snapshots the state of a :py:class:`abm1559.simulator.Simulation` to `directory`, so that an interrupted run can be resumed (see :py:meth:`resume`) and continue exactly as it would have.
+
+    Each call to :py:meth:`save` writes a new compressed segment holding only what changed since the previous one: the blocks added to the chain, the users added to the user pool and the users who were live at the previous segment, whose state may have changed since. The live part of the state (transaction pool, live and pending users, environment, generator states and identifier counter) is written in full, its size is bounded by the live population rather than the length of the run.
+
+    A new checkpointer refuses to save to a directory already holding segments, which should be resumed (see :py:func:`abm1559.checkpoint.resume`) or removed first.
+
+    Components are restored into a simulation built with the same arguments as the original one, so that callables, writers and the config need not be stored. State held by subclasses of `Simulation` beyond these components is not saved.
+
+    Args:
+        directory (str): Where segments are written, created if needed
+        every (int): With :py:meth:`run`, save after every `every` blocks
+    """
+
+    def __init__(self, directory: str, every: int = None):
+        self.directory = directory
+        self.every = every
+        os.makedirs(directory, exist_ok=True)
+
+        # Number of segments, blocks, running totals and users already saved
+        self.segments = 0
+        self.saved_blocks = 0
+        self.saved_totals = 0
+        self.saved_users = 0
+        # Users live at the last segment
+        self.saved_live = []
+
+    def segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"checkpoint-{index:06d}.bin")
+
+    def saved_segments(self) -> int:
+        return len(glob.glob(os.path.join(self.directory, "checkpoint-*.bin")))
+
+    def save(self, simulation) -> str:
+        """
+        Writes a new segment.
+
+        Returns:
+            str: Path to the segment
+        """
+
+        if self.segments == 0 and self.saved_segments() > 0:
+            raise FileExistsError(f"{self.directory} already holds a checkpoint, resume it or remove it first")
+
+        chain = simulation.chain
+        user_pool = simulation.user_pool
+
+        new_heights = chain.heights[self.saved_blocks:]
+        totals_from = min(self.saved_totals, chain.modified_from.get("checkpoint", 0))
+        if user_pool.keep_retired:
+            # Users are never removed from `users`, new ones are at its end
+            new_users = list(islice(reversed(user_pool.users.values()), len(user_pool.users) - self.saved_users))[::-1]
+        else:
+            new_users = list(user_pool.users.values())
+        # Users live at the last segment may have changed since, even if they retired
+        new_keys = set(user.pub_key for user in new_users)
+        changed_users = [
+            user_pool.users[pub_key] for pub_key in self.saved_live
+            if not pub_key in new_keys and pub_key in user_pool.users
+        ]
+
+        state = {
+            "t": simulation.t,
+            "env": simulation.env,
+            "rng": { name: config.get_rng_state(generator) for name, generator in simulation.generators().items() },
+            "global_rng": config.rng.bit_generator.state,
+            "ids": config.ids.value,
+            "chain": {
+                "current_head": chain.current_head,
+                "heights": new_heights,
+                "hashes": [chain.hashes[height] for height in new_heights],
+                "blocks": [chain.blocks[chain.hashes[height]] for height in new_heights if chain.hashes[height] in chain.blocks],
+                "totals_from": totals_from,
+                "totals": { name: totals[totals_from:] for name, totals in chain.totals.items() },
+            },
+            "user_pool": {
+                "new_users": new_users + changed_users,
+                "live_users": list(user_pool.live_users.values()),
+                "pending_users": user_pool.pending_users,
+            },
+            "txpool": simulation.txpool,
+        }
+
+        buffer = io.BytesIO()
+        _Pickler(buffer, _generators(simulation)).dump(state)
+        path = self.segment_path(self.segments)
+        with open(path + ".tmp", "wb") as f:
+            f.write(zlib.compress(buffer.getbuffer()))
+        os.replace(path + ".tmp", path)
+
+        self.segments += 1
+        self.saved_blocks = len(chain.heights)
+        self.saved_totals = len(chain.heights) + 1
+        self.saved_users = len(user_pool.users)
+        self.saved_live = list(user_pool.live_users)
+        chain.modified_from["checkpoint"] = self.saved_totals
+        return path
+
+    def load_segment(self, index: int, simulation) -> Dict:
+        with open(self.segment_path(index), "rb") as f:
+            buffer = io.BytesIO(zlib.decompress(f.read()))
+        return _Unpickler(buffer, _generators(simulation)).load()
+
+    def resume(self, simulation) -> None:
+        """
+        Restores the state saved in `directory` into `simulation`, which should be freshly built with the same arguments as the saved one. Later calls to :py:meth:`save` keep adding segments.
+        """
+
+        segments = self.saved_segments()
+        if segments == 0:
+            raise FileNotFoundError(f"No checkpoint in {self.directory}")
+
+        chain = simulation.chain
+        user_pool = simulation.user_pool
+        for index in range(segments):
+            state = self.load_segment(index, simulation)
+
+            saved_chain = state["chain"]
+            for height, block_hash in zip(saved_chain["heights"], saved_chain["hashes"]):
+                chain.positions[height] = len(chain.heights)
+                chain.heights.append(height)
+                chain.hashes[height] = block_hash
+            for block in saved_chain["blocks"]:
+                chain.blocks[block.block_hash] = block
+                if not chain.retain is None and len(chain.blocks) > chain.retain:
+                    del chain.blocks[next(iter(chain.blocks))]
+            for name, totals in saved_chain["totals"].items():
+                del chain.totals[name][saved_chain["totals_from"]:]
+                chain.totals[name].extend(totals)
+            chain.current_head = saved_chain["current_head"]
+
+            if not user_pool.keep_retired:
+                user_pool.users = {}
+            for user in state["user_pool"]["new_users"]:
+                user_pool.users[user.pub_key] = user
+
+        # The live state of the last segment is current
+        user_pool.live_users = { user.pub_key: user for user in state["user_pool"]["live_users"] }
+        user_pool.users_by_wakeup = defaultdict(dict)
+        for pub_key, user in user_pool.live_users.items():
+            user_pool.users[pub_key] = user
+            user_pool.users_by_wakeup[user.wakeup_block][pub_key] = user
+        user_pool.pending_users = state["user_pool"]["pending_users"]
+        simulation.txpool = state["txpool"]
+
+        simulation.t = state["t"]
+        simulation.env = state["env"]
+        generators = simulation.generators()
+        for name, rng_state in state["rng"].items():
+            config.set_rng_state(generators[name], rng_state)
+        config.rng.bit_generator.state = state["global_rng"]
+        config.ids.value = state["ids"]
+
+        self.segments = segments
+        self.saved_blocks = len(chain.heights)
+        self.saved_totals = len(chain.heights) + 1
+        self.saved_users = len(user_pool.users)
+        self.saved_live = list(user_pool.live_users)
+        chain.modified_from["checkpoint"] = self.saved_totals
+
+    def run(self, simulation, blocks: int = None) -> Iterator[Dict]:
+        """
+        Same as :py:meth:`abm1559.simulator.Simulation.run`, saving a segment every `every` blocks and after the last one.
+        """
+
+        for row_metrics in simulation.run(blocks):
+            yield row_metrics
+            if not self.every is None and simulation.t % self.every == 0:
+                self.save(simulation)
+        if self.every is None or simulation.t % self.every != 0:
+            self.save(simulation)
+
+def resume(simulation, directory: str, every: int = None) -> Checkpointer:
+    """
+    Restores `simulation` from the checkpoint in `directory`.
+
+    Returns:
+        Checkpointer: Saving further segments to `directory`
+    """
+
+    checkpointer = Checkpointer(directory, every=every)
+    checkpointer.resume(simulation)
+    return checkpointer
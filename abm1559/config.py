@@ -1,3 +1,159 @@
+from typing import Mapping, Dict, Sequence
+
 import numpy as np
 
-rng = np.random.default_rng()
\ No newline at end of file
+from abm1559.utils import IdCounter, constants
+
+rng = np.random.default_rng()
+
+ids = IdCounter()
+
+class BufferedGenerator:
+    """
+    A `np.random.Generator` serving scalar uniforms and bytes from blocks drawn `size` at a time, so that hot paths drawing one value per call (e.g., the value of a new user or the hash of a new transaction) do not pay the overhead of a call to the generator each time. Other methods, and draws of more than one value, are those of the underlying generator.
+
+    Draws are reproducible given the seed, but not identical to those of the underlying generator called directly, since blocks are drawn ahead.
+
+    Args:
+        seed: Seed of the underlying generator, or the generator itself
+        size (int): Number of uniforms (and bytes, eight times as many) drawn at a time
+    """
+
+    def __init__(self, seed=None, size: int = 4096):
+        self.generator = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+        self.size = size
+        self._uniforms = []
+        self._next_uniform = 0
+        self._bytes = b""
+        self._next_byte = 0
+
+    def __getattr__(self, name):
+        # Not called for attributes of the instance, only for the methods of the generator
+        if name.startswith("__") or name == "generator":
+            raise AttributeError(name)
+        return getattr(self.generator, name)
+
+    def random(self, size=None):
+        if not size is None:
+            return self.generator.random(size)
+        if self._next_uniform == len(self._uniforms):
+            self._uniforms = self.generator.random(self.size).tolist()
+            self._next_uniform = 0
+        u = self._uniforms[self._next_uniform]
+        self._next_uniform += 1
+        return u
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        if not size is None:
+            return self.generator.uniform(low, high, size)
+        return low + (high - low) * self.random()
+
+    def bytes(self, length: int) -> bytes:
+        start = self._next_byte
+        if start + length > len(self._bytes):
+            self._bytes = self._bytes[start:] + self.generator.bytes(max(8 * self.size, length))
+            start = 0
+        self._next_byte = start + length
+        return self._bytes[start:start + length]
+
+    @property
+    def state(self) -> Dict:
+        """
+        State of the underlying bit generator and of the undrawn part of the buffers, which may be set to rewind the generator.
+        """
+        return {
+            "bit_generator": self.generator.bit_generator.state,
+            "uniforms": self._uniforms[self._next_uniform:],
+            "bytes": self._bytes[self._next_byte:],
+        }
+
+    @state.setter
+    def state(self, state: Dict) -> None:
+        self.generator.bit_generator.state = state["bit_generator"]
+        self._uniforms = list(state["uniforms"])
+        self._next_uniform = 0
+        self._bytes = state["bytes"]
+        self._next_byte = 0
+
+def get_rng_state(generator) -> Dict:
+    """
+    State of a `np.random.Generator` or :py:class:`abm1559.config.BufferedGenerator`.
+    """
+    if isinstance(generator, BufferedGenerator):
+        return generator.state
+    return generator.bit_generator.state
+
+def set_rng_state(generator, state: Dict) -> None:
+    if isinstance(generator, BufferedGenerator):
+        generator.state = state
+    else:
+        generator.bit_generator.state = state
+
+# Named streams of a seeded simulation, see :py:class:`abm1559.config.RngStreams`
+STREAMS = ("demand", "values", "ids", "tiebreak")
+
+class RngStreams(Mapping):
+    """
+    Independent random streams derived from a single seed, one per component of a simulation, so that each component is reproducible on its own, e.g., changing how ties between transactions are broken does not change the values of users. Streams are :py:class:`abm1559.config.BufferedGenerator`, keyed by name:
+
+    - `demand`: Number of new users at each block
+    - `values`: Values and costs of users
+    - `ids`: Public keys, transaction and block hashes
+    - `tiebreak`: Ties between transactions in the pool
+
+    Args:
+        seed: Root seed, an integer or a `np.random.SeedSequence`
+        names (Sequence[str]): Names of the streams
+        size (int): Buffer size of each stream
+    """
+
+    def __init__(self, seed=None, names: Sequence[str] = STREAMS, size: int = 4096):
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self._streams = {
+            name: BufferedGenerator(np.random.default_rng(child), size=size)
+            for name, child in zip(names, self.seed_sequence.spawn(len(names)))
+        }
+
+    def __getitem__(self, name: str) -> BufferedGenerator:
+        return self._streams[name]
+
+    def __iter__(self):
+        return iter(self._streams)
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+class Config(Mapping):
+    """
+    An immutable set of protocol constants, carried by a simulation and passed to the functions reading them (e.g., :py:func:`abm1559.simulator.update_basefee`). Keys are those of :py:data:`abm1559.utils.constants`, which gives the default values at the time the config is created.
+
+    Since a config is never modified in place, simulations with different settings can run side by side in the same process.
+    """
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(constants)
+        if len(unknown) > 0:
+            raise KeyError(f"Unknown constants {sorted(unknown)}")
+        self._values = { **constants, **overrides }
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __hash__(self) -> int:
+        return hash(tuple(self._values.items()))
+
+    def __repr__(self) -> str:
+        return f"Config({self._values})"
+
+    def replace(self, **overrides):
+        """
+        Returns:
+            Config: A copy of this config with `overrides` applied
+        """
+        return Config(**{ **self._values, **overrides })
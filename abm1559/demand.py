@@ -0,0 +1,123 @@
+from typing import Sequence, Iterator
+import numpy as np
+
+from abm1559.config import rng
+
+###
+# Demand scenarios, vectorized and returning NumPy arrays
+###
+
+def poisson_process(l: float, duration: float, rng: np.random.Generator = rng) -> np.ndarray:
+    """
+    Arrival times of a Poisson process of rate `l` over `[0, duration)`.
+    """
+
+    # Draw enough inter-arrival times at once to cover `duration` with high probability
+    expected = l * duration
+    arrivals = np.cumsum(rng.exponential(1.0 / l, size=int(expected + 5 * np.sqrt(expected) + 10)))
+    while arrivals[-1] < duration:
+        more = np.cumsum(rng.exponential(1.0 / l, size=int(expected / 10 + 10)))
+        arrivals = np.concatenate([arrivals, arrivals[-1] + more])
+    return arrivals[arrivals < duration]
+
+def discounted_cumsum(x: np.ndarray, discount: float = 0.0, initial: float = 0.0) -> np.ndarray:
+    """
+    `y[k] = x[k] + (1 - discount) * y[k-1]`, with `y[-1] = initial`. `discount` must be within [0, 1].
+    """
+
+    if not 0.0 <= discount <= 1.0:
+        raise ValueError(f"Discount {discount} is not within [0, 1]")
+    x = np.asarray(x, dtype=np.float64)
+    decay = 1.0 - discount
+    if discount == 0.0:
+        return initial + np.cumsum(x)
+    if decay == 0.0:
+        return x.copy()
+
+    # Within a chunk, y[k] = decay^k * cumsum(x[j] / decay^j) + initial * decay^(k+1)
+    # Chunks are short enough that decay^-k stays well within float range
+    chunk_size = max(1, int(np.log(1e-8) / np.log(decay)))
+    y = np.empty_like(x)
+    for start in range(0, len(x), chunk_size):
+        chunk = x[start:start + chunk_size]
+        powers = decay ** np.arange(len(chunk))
+        y[start:start + len(chunk)] = powers * np.cumsum(chunk / powers) + initial * decay * powers
+        initial = y[start + len(chunk) - 1]
+    return y
+
+def jump_process(arrivals: Sequence[float], duration: int, jump_mean: float, rng: np.random.Generator = rng, discount: float = 0.0) -> np.ndarray:
+    """
+    Demand jumping by an exponential amount of mean `jump_mean` at each arrival, decaying by `discount` per step.
+
+    Args:
+        arrivals (Sequence[float]): Arrival times, e.g., from :py:func:`abm1559.demand.poisson_process`
+        duration (int): Number of steps
+        jump_mean (float): Mean size of a jump
+        discount (float): Fraction of the accumulated jumps lost at each step
+
+    Returns:
+        np.ndarray: Demand at each step
+    """
+
+    steps = np.floor(np.asarray(arrivals)).astype(np.int64)
+    steps = steps[(steps >= 0) & (steps < duration)]
+    jumps = rng.exponential(jump_mean, size=len(steps))
+    return discounted_cumsum(np.bincount(steps, weights=jumps, minlength=duration), discount)
+
+def jump_process_chunks(l: float, duration: int, jump_mean: float, rng: np.random.Generator = rng, discount: float = 0.0, chunk_size: int = 100000) -> Iterator[np.ndarray]:
+    """
+    Same process as :py:func:`abm1559.demand.jump_process` over arrivals of rate `l`, generated `chunk_size` steps at a time for long horizons.
+
+    Arrivals in each step are Poisson distributed and the sum of their exponential jumps is Gamma distributed, so no arrival times are drawn.
+    """
+
+    current = 0.0
+    for start in range(0, duration, chunk_size):
+        size = min(chunk_size, duration - start)
+        counts = rng.poisson(l, size=size)
+        jumps = np.zeros(size)
+        jumps[counts > 0] = rng.gamma(counts[counts > 0], jump_mean)
+        chunk = discounted_cumsum(jumps, discount, initial=current)
+        current = chunk[-1]
+        yield chunk
+
+def _brownian_chunks(T: int, paths: int, rng: np.random.Generator, chunk_size: int) -> Iterator[tuple]:
+    # Times and Brownian motion `(t, w)` of shape `(paths, chunk)`, continuing across chunks
+    w = np.zeros((paths, 1))
+    for start in range(0, T, chunk_size):
+        size = min(chunk_size, T - start)
+        t = np.arange(start + 1, start + size + 1)[np.newaxis, :]
+        chunk_w = w + rng.normal(size=[paths, size]).cumsum(axis=1)
+        w = chunk_w[:, -1:]
+        yield t, chunk_w
+
+def abm_chunks(lambda_0: float, T: int, paths: int = 1, mu: float = 0.5, sigma: float = 1, rng: np.random.Generator = rng, chunk_size: int = 100000) -> Iterator[np.ndarray]:
+    """
+    Arithmetic Brownian motion, as :py:func:`abm1559.simulator.generate_abm`, in chunks of shape `(paths, chunk_size)`.
+    """
+
+    for t, w in _brownian_chunks(T, paths, rng, chunk_size):
+        yield lambda_0 + mu * t + sigma * w
+
+def gbm_chunks(lambda_0: float, T: int, paths: int = 1, mu: float = 0.5, sigma: float = 1, rng: np.random.Generator = rng, chunk_size: int = 100000) -> Iterator[np.ndarray]:
+    """
+    Geometric Brownian motion, as :py:func:`abm1559.simulator.generate_gbm`, in chunks of shape `(paths, chunk_size)`.
+    """
+
+    for t, w in _brownian_chunks(T, paths, rng, chunk_size):
+        yield lambda_0 * np.exp((mu - 0.5 * sigma**2) * t + sigma * w)
+
+def apply_block_time_variance(demand_process: Sequence[float], blocks: int, mean_ia_time: float = 13, rng: np.random.Generator = rng) -> np.ndarray:
+    """
+    Aggregates a per-second demand process into blocks with exponentially distributed inter-arrival times of mean `mean_ia_time` (truncated to whole seconds).
+
+    Returns:
+        np.ndarray: Demand of each block, truncated to integers
+    """
+
+    ia_times = rng.exponential(mean_ia_time, blocks).astype(np.int64)
+    ends = np.cumsum(ia_times)
+    if len(ends) > 0 and ends[-1] > len(demand_process):
+        raise ValueError(f"Demand process of length {len(demand_process)} is too short for {blocks} blocks ({ends[-1]} seconds drawn)")
+    totals = np.concatenate([[0.0], np.cumsum(demand_process, dtype=np.float64)])
+    return (totals[ends] - totals[ends - ia_times]).astype(np.int64)
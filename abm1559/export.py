@@ -0,0 +1,154 @@
+from typing import Sequence, Dict, Iterable
+
+###
+# Streaming columnar exports, requires `pyarrow`
+###
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError("Columnar exports require pyarrow, install it with `pip install abm1559[export]`") from e
+    return pyarrow
+
+class RecordWriter:
+    """
+    Appends records to a Parquet (`format = "parquet"`) or Arrow IPC (`format = "arrow"`) file, holding at most `buffer_size` records in memory.
+
+    The file is opened when the first `buffer_size` records are flushed (or on close). Its columns are the union of the keys of these records, in the order they first appear, and records missing a column are written with a null value. The type of each column is inferred from its values in these records, columns only holding nulls being of null type, unless given in `types` (`pyarrow` types or their names, e.g., `"float64"`, by column). The schema is then fixed, and later records with a new column or a value of another type raise `ValueError`. Columns given in `types` are always written, so that columns which may be null for long or only appear later, e.g., those of escalators in a chain mostly made of 1559 transactions, should be given there. Object columns (`tx` and `user` in :py:meth:`abm1559.txs.Transaction.tx_data` and :py:meth:`abm1559.users.User.export`) are never written.
+    """
+
+    def __init__(
+        self, path: str, format: str = "parquet", buffer_size: int = 100000,
+        exclude: Sequence[str] = ("tx", "user"), types: Dict = None,
+    ):
+        if not format in ["parquet", "arrow"]:
+            raise ValueError(f"Unknown format {format}, expected parquet or arrow")
+
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.format = format
+        self.buffer_size = buffer_size
+        self.exclude = set(exclude)
+        self.types = {
+            column: self.pa.type_for_alias(dtype) if isinstance(dtype, str) else dtype
+            for column, dtype in ({} if types is None else types).items() if not column in self.exclude
+        }
+        self.columns = []
+        self.rows_written = 0
+        self._buffer = {}
+        self._buffered = 0
+        self._schema = None
+        self._writer = None
+
+    def write(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            buffer = self._buffer
+            for column in record.keys():
+                if not column in buffer and not column in self.exclude:
+                    if not self._schema is None:
+                        raise ValueError(f"Column {column} is not in the schema of {self.path}, fixed when the file was opened")
+                    self.columns.append(column)
+                    buffer[column] = [None] * self._buffered
+            for column in self.columns:
+                buffer[column].append(record.get(column))
+            self._buffered += 1
+            if self._buffered >= self.buffer_size:
+                self.flush()
+
+    def _table(self):
+        # Records of the buffer, with the schema of the file once it is opened
+        pa = self.pa
+        if not self._schema is None:
+            try:
+                return pa.Table.from_pydict(self._buffer, schema=self._schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError) as e:
+                raise ValueError(f"Records do not match the schema of {self.path}, columns first null may be given in types: {e}") from e
+
+        # Columns given in `types` but not seen yet are written too
+        for column in self.types:
+            if not column in self._buffer:
+                self.columns.append(column)
+                self._buffer[column] = [None] * self._buffered
+        arrays = [
+            pa.array(self._buffer[column], type=self.types.get(column))
+            for column in self.columns
+        ]
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+    def flush(self) -> None:
+        if self._buffered == 0:
+            return
+
+        table = self._table()
+        if self._writer is None:
+            self._schema = table.schema
+            if self.format == "parquet":
+                self._writer = self.pa.parquet.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = self.pa.ipc.new_file(self.path, self._schema)
+        self._writer.write_table(table)
+
+        self.rows_written += self._buffered
+        self._buffer = { column: [] for column in self.columns }
+        self._buffered = 0
+
+    def close(self) -> None:
+        # The file stays readable even if the last records do not match its schema
+        try:
+            self.flush()
+        finally:
+            if not self._writer is None:
+                self._writer.close()
+                self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Columns of the transactions of `abm1559.txs` absent from some of them
+_TX_TYPES = { "gas_premium": "float64", "max_fee": "float64", "tip": "float64", "start_premium": "float64", "gas_price": "float64" }
+# Columns of the users of `abm1559.users` absent from some of them
+_USER_TYPES = { "user_type": "string", "cost_per_unit": "float64", "discount_rate": "float64" }
+
+class ChainWriter(RecordWriter):
+    """
+    Writes the transactions of each block, with the same columns as :py:meth:`abm1559.chain.Chain.export`, along with the columns of every transaction type of :py:mod:`abm1559.txs` (null when absent). Pass it as `writer` to :py:class:`abm1559.chain.Chain`.
+    """
+
+    def __init__(self, path: str, types: Dict = None, **kwargs):
+        super().__init__(path, types={ **_TX_TYPES, **({} if types is None else types) }, **kwargs)
+
+    def write_block(self, block) -> None:
+        self.write(block.txs_data())
+
+class UserWriter(RecordWriter):
+    """
+    Writes users as they are added, with the same columns as :py:meth:`abm1559.userpool.UserPool.export`, along with the columns of every user type of :py:mod:`abm1559.users` (null when absent). Pass it as `writer` to :py:class:`abm1559.userpool.UserPool`.
+    """
+
+    def __init__(self, path: str, types: Dict = None, **kwargs):
+        super().__init__(path, types={ **_USER_TYPES, **({} if types is None else types) }, **kwargs)
+
+    def write_users(self, users) -> None:
+        self.write(user.export() for user in users)
+
+def open_export(path: str, format: str = "parquet"):
+    """
+    Opens an export lazily: the returned `pyarrow.dataset.Dataset` only reads the columns and rows requested, e.g., `open_export(path).to_table(columns=["block_height", "tip"])`.
+    """
+
+    pa = _import_pyarrow()
+    return pa.dataset.dataset(path, format="ipc" if format == "arrow" else format)
+
+def read_export(path: str, columns: Sequence[str] = None, format: str = "parquet"):
+    """
+    Reads `columns` (all by default) of an export into a DataFrame.
+    """
+
+    return open_export(path, format=format).to_table(columns=columns).to_pandas()
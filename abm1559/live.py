@@ -0,0 +1,481 @@
+import asyncio
+import json
+from time import perf_counter
+from typing import Sequence, Dict, List, Tuple, AsyncIterator, Awaitable, Callable
+import numpy as np
+
+from abm1559.config import ids
+from abm1559.txs import Transaction, Tx1559, TxFloatingEsc
+from abm1559.simulator import Simulation
+
+class LatencyWindow:
+    """
+    The most recent `size` latency samples, in seconds, kept in a ring buffer so that long soak tests use constant memory.
+
+    Args:
+        size (int): Number of samples kept
+    """
+
+    def __init__(self, size: int = 100000):
+        self.samples = np.empty(size)
+        self.size = size
+        # Total number of samples ever added
+        self.n = 0
+
+    def add(self, latencies: np.ndarray) -> None:
+        latencies = np.asarray(latencies, dtype=np.float64)[-self.size:]
+        start = self.n % self.size
+        head = min(len(latencies), self.size - start)
+        self.samples[start:start + head] = latencies[:head]
+        self.samples[:len(latencies) - head] = latencies[head:]
+        self.n += len(latencies)
+
+    def percentiles(self, qs: Sequence[float] = (50, 90, 99)) -> Dict[str, float]:
+        if self.n == 0:
+            return { f"p{q}": np.nan for q in qs }
+        values = np.percentile(self.samples[:min(self.n, self.size)], qs)
+        return { f"p{q}": value for q, value in zip(qs, values) }
+
+class LiveStats:
+    """
+    Throughput and latency counters of a :py:class:`abm1559.live.LiveSimulation`.
+
+    Ingest latency runs from the receipt of a message to the insertion of its transaction in the pool, inclusion latency from its receipt to the sealing of the block including it. Both are measured on the wall clock.
+
+    Args:
+        window (int): Number of latency samples kept, see :py:class:`abm1559.live.LatencyWindow`
+    """
+
+    def __init__(self, window: int = 100000):
+        self.received = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.evicted = 0
+        self.included = 0
+        self.blocks = 0
+        self.max_queue_depth = 0
+        self.ingest_latency = LatencyWindow(window)
+        self.inclusion_latency = LatencyWindow(window)
+        self.started = perf_counter()
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = perf_counter() - self.started
+        return {
+            "elapsed": elapsed,
+            "received": self.received,
+            "rejected": self.rejected,
+            "inserted": self.inserted,
+            "evicted": self.evicted,
+            "included": self.included,
+            "blocks": self.blocks,
+            "max_queue_depth": self.max_queue_depth,
+            "received_per_second": self.received / elapsed if elapsed > 0 else np.nan,
+            "included_per_second": self.included / elapsed if elapsed > 0 else np.nan,
+            **{ f"ingest_{k}": v for k, v in self.ingest_latency.percentiles().items() },
+            **{ f"inclusion_{k}": v for k, v in self.inclusion_latency.percentiles().items() },
+        }
+
+# Signature of the callback sources feed their messages to
+Put = Callable[[bytes], Awaitable[None]]
+
+class Source:
+    """
+    An abstract source of transaction messages, one JSON object per message, e.g., `{"nonce": 0, "gasPremium": 1000000000, "feeCap": 10000000000}` as published by `nats-tx-bazooka.py`.
+    """
+
+    async def feed(self, put: Put) -> None:
+        """
+        Awaits `put` on each message until the source is exhausted. `put` blocks while the ingestion queue is full.
+        """
+        assert False, "This method needs to be overridden"
+
+class QueueSource(Source):
+    """
+    Reads messages from an in-process `asyncio.Queue` until `None` is received.
+    """
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    async def feed(self, put: Put) -> None:
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            await put(message)
+
+async def _feed_lines(reader: asyncio.StreamReader, put: Put) -> None:
+    async for line in reader:
+        line = line.strip()
+        if line:
+            await put(line)
+
+class StreamSource(Source):
+    """
+    Reads newline-delimited JSON messages from an `asyncio.StreamReader` until EOF.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+
+    async def feed(self, put: Put) -> None:
+        await _feed_lines(self.reader, put)
+
+class _ServerSource(Source):
+
+    def __init__(self, connections: int = None):
+        self.connections = connections
+        self.server = None
+        # Set once publishers may connect
+        self.started = asyncio.Event()
+
+    async def start_server(self, handler):
+        assert False, "This method needs to be overridden"
+
+    async def feed(self, put: Put) -> None:
+        closed = asyncio.Queue()
+
+        async def handle(reader, writer):
+            try:
+                await _feed_lines(reader, put)
+            finally:
+                writer.close()
+                await closed.put(None)
+
+        self.server = await self.start_server(handle)
+        self.started.set()
+        try:
+            if self.connections is None:
+                await self.server.serve_forever()
+            for _ in range(self.connections):
+                await closed.get()
+        finally:
+            self.server.close()
+
+class TCPSource(_ServerSource):
+    """
+    Listens on a local TCP socket, a stand-in for the message bus, and reads newline-delimited JSON messages from every publisher connecting to it.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on, 0 picks a free port which is set once `started` is
+        connections (int): The source is exhausted once this many publishers have disconnected. Defaults to never.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, connections: int = None):
+        super().__init__(connections)
+        self.host = host
+        self.port = port
+
+    async def start_server(self, handler):
+        server = await asyncio.start_server(handler, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        return server
+
+class UnixSource(_ServerSource):
+    """
+    As :py:class:`abm1559.live.TCPSource`, listening on the Unix socket `path` instead.
+    """
+
+    def __init__(self, path: str, connections: int = None):
+        super().__init__(connections)
+        self.path = path
+
+    async def start_server(self, handler):
+        return await asyncio.start_unix_server(handler, self.path)
+
+def decode_messages(messages: Sequence[bytes]) -> List[Dict]:
+    """
+    Decodes a batch of JSON messages with a single call to `json.loads`, falling back to decoding them one by one if any is malformed, in which case it decodes to `None`.
+    """
+
+    try:
+        decoded = json.loads(b"[" + b",".join(messages) + b"]")
+        if len(decoded) == len(messages):
+            return decoded
+    except ValueError:
+        pass
+
+    decoded = []
+    for message in messages:
+        try:
+            decoded.append(json.loads(message))
+        except ValueError:
+            decoded.append(None)
+    return decoded
+
+def decode_id(value) -> object:
+    """
+    Reads an identifier (e.g., `sender` or `hash`) from a decoded message: integers are kept as :py:class:`abm1559.utils.IdCounter` identifiers, strings are read as hexadecimal bytes, as written by :py:func:`abm1559.utils.hex_id`.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return bytes.fromhex(value)
+    raise TypeError(f"Invalid identifier {value!r}")
+
+# Ends the messages of a source in the ingestion queue
+_EOF = object()
+
+class LiveSimulation(Simulation):
+    """
+    A :py:class:`abm1559.simulator.Simulation` fed by a live stream of transactions rather than spawned users. Messages read from one or more :py:class:`abm1559.live.Source` are put in a bounded queue, so that sources slow down when the pool falls behind, then decoded in batches of up to `batch_size` messages into transactions inserted in the pool.
+
+    Blocks are sealed every `block_time` seconds, with the basefee updated after each block. When `realtime` is set, blocks are sealed on the wall clock. Otherwise, time is read from the `timestamp` field of the messages (in seconds, messages without one take the time of the previous message), and a block is sealed as soon as a message past its end is decoded. The latter is deterministic and replays a stream as fast as it can be decoded.
+
+    Messages are decoded by :py:meth:`decode_tx`, with identifiers (`sender`, `hash`) read by :py:func:`abm1559.live.decode_id` or assigned when missing, by default into :py:class:`abm1559.txs.Tx1559` with `gas_premium` and `max_fee` read from `gasPremium` and `feeCap`. Messages of `"type": "floatingesc"` are decoded into :py:class:`abm1559.txs.TxFloatingEsc` escalating from `startPremium` to `maxPremium` over the next `duration` blocks, capped by `feeCap`. Malformed messages are counted as rejected and dropped.
+
+    Args:
+        block_time (float): Seconds between two blocks
+        realtime (bool): Should blocks be sealed on the wall clock, or on the timestamps of the messages?
+        batch_size (int): Maximum number of messages decoded at once
+        max_queue (int): Maximum number of messages waiting to be decoded
+        TxClass (class): Class of the decoded 1559 transactions, built with `sender`, `tx_params`, `gas_used` and `tx_hash`
+        EscTxClass (class): Class of the decoded floating escalator transactions
+        stats (LiveStats): Throughput and latency counters, defaults to new ones
+        **kwargs: Passed on to :py:class:`abm1559.simulator.Simulation`
+    """
+
+    def __init__(
+        self, block_time: float = 13, realtime: bool = True,
+        batch_size: int = 256, max_queue: int = 10000,
+        TxClass=Tx1559, EscTxClass=TxFloatingEsc, stats: LiveStats = None, **kwargs
+    ):
+        super().__init__([], **kwargs)
+        self.block_time = block_time
+        self.realtime = realtime
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.TxClass = TxClass
+        self.EscTxClass = EscTxClass
+        self.stats = LiveStats() if stats is None else stats
+        self.queue = None
+        self.env["current_block"] = self.t
+
+        # Transactions received and evicted since the last block
+        self.received_txs = []
+        self.evicted_txs = []
+        # Receipt time of transactions in the pool, by hash
+        self.received_at = {}
+        # Timestamp of the latest message, when not `realtime`
+        self.clock = None
+        self.origin = None
+        self._end = None
+        self._rows = None
+
+    def decode_tx(self, message: Dict) -> Transaction:
+        """
+        Returns the transaction of a decoded message, raising `KeyError`, `TypeError` or `ValueError` if the message is malformed.
+        """
+        t = self.env["current_block"]
+        kwargs = {
+            "sender": decode_id(message["sender"]) if "sender" in message else ids(),
+            "gas_used": int(message.get("gas", self.config["SIMPLE_TRANSACTION_GAS"])),
+            "tx_hash": decode_id(message["hash"]) if "hash" in message else ids(),
+        }
+
+        if message.get("type") == "floatingesc":
+            return self.EscTxClass(
+                tx_params = {
+                    "start_block": t,
+                    "max_block": t + int(message["duration"]),
+                    "start_premium": int(message["startPremium"]),
+                    "max_premium": int(message["maxPremium"]),
+                    "max_fee": int(message["feeCap"]),
+                },
+                **kwargs,
+            )
+
+        return self.TxClass(
+            tx_params = {
+                "start_block": t,
+                "gas_premium": int(message["gasPremium"]),
+                "max_fee": int(message["feeCap"]),
+            },
+            **kwargs,
+        )
+
+    def insert_txs(self, txs: Sequence[Transaction], received: Sequence[float]) -> None:
+        """
+        Inserts decoded transactions in the pool, given the times they were received at.
+        """
+        if len(txs) == 0:
+            return
+        evicted_txs = self.add_txs(txs)
+        now = perf_counter()
+        self.received_txs += txs
+        self.evicted_txs += evicted_txs
+        self.received_at.update(zip([tx.tx_hash for tx in txs], received))
+        for tx in evicted_txs:
+            self.received_at.pop(tx.tx_hash, None)
+
+        stats = self.stats
+        stats.inserted += len(txs)
+        stats.evicted += len(evicted_txs)
+        stats.ingest_latency.add(now - np.asarray(received))
+
+    def seal(self) -> Dict:
+        """
+        Seals a block with the best transactions of the pool and updates the basefee.
+
+        Returns:
+            Dict: The metrics of the new block
+        """
+
+        t = self.t
+        timer = self.timer
+        timer.start(t)
+
+        selected_txs = self.select_transactions()
+        timer.lap("select_transactions")
+
+        block = self.build_block(selected_txs)
+        timer.lap("build_block")
+        self.chain.add_block(block)
+        timer.lap("add_block")
+
+        now = perf_counter()
+        received = [self.received_at.pop(tx.tx_hash, now) for tx in selected_txs]
+        stats = self.stats
+        stats.included += len(selected_txs)
+        stats.blocks += 1
+        stats.inclusion_latency.add(now - np.asarray(received))
+        self._prune_received()
+
+        row_metrics = {
+            **self.metrics(block, [], self.received_txs, self.evicted_txs),
+            "queue_depth": 0 if self.queue is None else self.queue.qsize(),
+        }
+        timer.lap("metrics")
+
+        self.env["basefee"] = self.update_basefee(block)
+        timer.lap("update_basefee")
+        self.t += 1
+        self.env["current_block"] = self.t
+        self.received_txs = []
+        self.evicted_txs = []
+
+        return row_metrics
+
+    def _prune_received(self) -> None:
+        # Pools may drop transactions without returning them, e.g., when they expire
+        pool_length = self.txpool.pool_length()
+        if len(self.received_at) > 2 * pool_length + 1024:
+            live = self.txpool.txs
+            self.received_at = { tx_hash: t for tx_hash, t in self.received_at.items() if tx_hash in live }
+
+    def _emit(self) -> bool:
+        # Seals a block and hands its metrics to `live`, unless enough blocks were sealed
+        if not self._end is None and self.t >= self._end:
+            return False
+        self._rows.put_nowait(self.seal())
+        return True
+
+    async def _put(self, message: bytes) -> None:
+        self.stats.received += 1
+        await self.queue.put((perf_counter(), message))
+        depth = self.queue.qsize()
+        if depth > self.stats.max_queue_depth:
+            self.stats.max_queue_depth = depth
+
+    async def _feed(self, source: Source) -> None:
+        try:
+            await source.feed(self._put)
+        except Exception as e:
+            self._rows.put_nowait(e)
+            return
+        await self.queue.put(_EOF)
+
+    def _decode_batch(self, batch: Sequence[Tuple[float, bytes]]) -> None:
+        messages = decode_messages([message for _, message in batch])
+        txs, received = [], []
+        for (t, _), message in zip(batch, messages):
+            if not self.realtime:
+                timestamp = None
+                if isinstance(message, dict):
+                    timestamp = message.get("timestamp")
+                if not isinstance(timestamp, (int, float)):
+                    timestamp = self.clock
+                if self.origin is None and not timestamp is None:
+                    self.origin = self.clock = timestamp
+                if not timestamp is None and timestamp > self.clock:
+                    self.clock = timestamp
+                # Transactions past the end of the current block go to the next ones
+                while not self.origin is None and self.clock >= self.origin + (self.t + 1) * self.block_time:
+                    self.insert_txs(txs, received)
+                    txs, received = [], []
+                    if not self._emit():
+                        return
+            try:
+                txs.append(self.decode_tx(message))
+                received.append(t)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                self.stats.rejected += 1
+        self.insert_txs(txs, received)
+
+    async def _decode(self, sources: int) -> None:
+        queue = self.queue
+        exhausted = 0
+        while exhausted < sources:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            exhausted += sum(1 for item in batch if item is _EOF)
+            self._decode_batch([item for item in batch if not item is _EOF])
+            # Lets sources and the block timer run between batches
+            await asyncio.sleep(0)
+
+    async def _tick(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.block_time
+            await asyncio.sleep(max(0, deadline - loop.time()))
+            if not self._emit():
+                return
+
+    async def _guard(self, coroutine) -> None:
+        # Failures and the end of the stream are reported to `live`
+        try:
+            await coroutine
+            self._rows.put_nowait(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._rows.put_nowait(e)
+
+    async def live(self, *sources: Source, blocks: int = None) -> AsyncIterator[Dict]:
+        """
+        Ingests transactions from `sources` and seals blocks until all sources are exhausted, or `blocks` blocks were sealed if given. Transactions left in the pool at the end are not sealed, which may be done with :py:meth:`seal`.
+
+        Args:
+            *sources (Source): Sources of transaction messages
+            blocks (int): Maximum number of blocks to seal
+
+        Returns:
+            AsyncIterator[Dict]: The metrics of each new block
+        """
+
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._rows = asyncio.Queue()
+        self._end = None if blocks is None else self.t + blocks
+
+        tasks = [asyncio.create_task(self._feed(source)) for source in sources]
+        tasks.append(asyncio.create_task(self._guard(self._decode(len(sources)))))
+        if self.realtime:
+            tasks.append(asyncio.create_task(self._guard(self._tick())))
+
+        try:
+            while True:
+                row = await self._rows.get()
+                if row is None:
+                    break
+                if isinstance(row, Exception):
+                    raise row
+                yield row
+                if not self._end is None and self.t >= self._end:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
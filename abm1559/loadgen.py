@@ -0,0 +1,297 @@
+import asyncio
+from time import perf_counter
+from typing import Sequence, Dict, List
+import numpy as np
+
+from abm1559.config import rng, Config
+from abm1559.txs import Transaction, Tx1559, TxFloatingEsc
+from abm1559.users import User1559, UserBatch
+from abm1559.simulator import shares_to_sizes
+from abm1559.live import LatencyWindow
+from abm1559.utils import hex_id
+
+# One message per transaction type, read back by :py:meth:`abm1559.live.LiveSimulation.decode_tx`
+_TEMPLATE_1559 = '{"nonce":%d,"sender":%s,"gasPremium":%d,"feeCap":%d,"gas":%d,"timestamp":%.6f}'
+_TEMPLATE_FLOATINGESC = '{"type":"floatingesc","nonce":%d,"sender":%s,"startPremium":%d,"maxPremium":%d,"feeCap":%d,"duration":%d,"gas":%d,"timestamp":%.6f}'
+
+def _encode_id(identifier) -> str:
+    # Integers are sent as JSON numbers, bytes as hexadecimal strings (see `abm1559.live.decode_id`)
+    if isinstance(identifier, int):
+        return str(identifier)
+    return '"%s"' % hex_id(identifier)
+
+def encode_txs(txs: Sequence[Transaction], nonces: Sequence[int], timestamps: Sequence[float]) -> List[bytes]:
+    """
+    Encodes transactions as JSON messages, formatted from a template per transaction type rather than through `json.dumps`. Senders are written as JSON numbers when they are integers, as hexadecimal strings otherwise.
+
+    Args:
+        txs (Sequence[Transaction]): :py:class:`abm1559.txs.Tx1559` or :py:class:`abm1559.txs.TxFloatingEsc` transactions
+        nonces (Sequence[int]): Nonce of each message
+        timestamps (Sequence[float]): Time each transaction is sent at, in seconds
+
+    Returns:
+        List[bytes]: One message per transaction
+    """
+
+    messages = []
+    for tx, nonce, timestamp in zip(txs, nonces, timestamps):
+        if isinstance(tx, Tx1559):
+            message = _TEMPLATE_1559 % (
+                nonce, _encode_id(tx.sender), tx.gas_premium, tx.max_fee, tx.gas_used, timestamp,
+            )
+        elif isinstance(tx, TxFloatingEsc):
+            message = _TEMPLATE_FLOATINGESC % (
+                nonce, _encode_id(tx.sender), tx.start_premium, tx.max_premium, tx.max_fee,
+                tx.max_block - tx.start_block, tx.gas_used, timestamp,
+            )
+        else:
+            raise TypeError(f"No message encoding for {type(tx).__name__}")
+        messages.append(message.encode())
+    return messages
+
+class Sink:
+    """
+    An abstract destination of the messages of a :py:class:`abm1559.loadgen.LoadGenerator`.
+    """
+
+    async def open(self) -> None:
+        pass
+
+    async def send(self, messages: Sequence[bytes]) -> None:
+        """
+        Sends a batch of messages, returning once the sink accepted all of them.
+        """
+        assert False, "This method needs to be overridden"
+
+    async def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        """
+        Closes the sink without waiting, when a run fails or is cancelled.
+        """
+        pass
+
+class QueueSink(Sink):
+    """
+    Puts messages in an in-process `asyncio.Queue`, e.g., read by a :py:class:`abm1559.live.QueueSource`, waiting while it is full. `None` is put on close, which exhausts the source.
+    """
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    async def send(self, messages: Sequence[bytes]) -> None:
+        queue = self.queue
+        for message in messages:
+            if queue.full():
+                await queue.put(message)
+            else:
+                queue.put_nowait(message)
+
+    async def close(self) -> None:
+        await self.queue.put(None)
+
+class StreamSink(Sink):
+    """
+    Writes batches of newline-delimited messages to an `asyncio.StreamWriter`, waiting for the transport to drain after each batch.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter = None):
+        self.writer = writer
+
+    async def send(self, messages: Sequence[bytes]) -> None:
+        self.writer.write(b"\n".join(messages) + b"\n")
+        await self.writer.drain()
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    def abort(self) -> None:
+        if not self.writer is None:
+            self.writer.transport.abort()
+
+class TCPSink(StreamSink):
+    """
+    Connects to a local TCP socket, e.g., listened on by a :py:class:`abm1559.live.TCPSource`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 4222):
+        super().__init__()
+        self.host = host
+        self.port = port
+
+    async def open(self) -> None:
+        _, self.writer = await asyncio.open_connection(self.host, self.port)
+
+class UnixSink(StreamSink):
+    """
+    Connects to the Unix socket `path`, e.g., listened on by a :py:class:`abm1559.live.UnixSource`.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    async def open(self) -> None:
+        _, self.writer = await asyncio.open_unix_connection(self.path)
+
+class FileSink(Sink):
+    """
+    Appends newline-delimited messages to the file `path`, which may later be replayed through a :py:class:`abm1559.live.StreamSource`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    async def open(self) -> None:
+        self.file = open(self.path, "ab")
+
+    async def send(self, messages: Sequence[bytes]) -> None:
+        self.file.write(b"\n".join(messages) + b"\n")
+
+    async def close(self) -> None:
+        self.file.close()
+
+    def abort(self) -> None:
+        if not self.file is None:
+            self.file.close()
+
+class LoadStats:
+    """
+    Counters of a :py:class:`abm1559.loadgen.LoadGenerator` run. Send latency is the time taken by the sink to accept a batch, lag the time a batch was sent after it was due, both in seconds.
+
+    Args:
+        window (int): Number of latency samples kept, see :py:class:`abm1559.live.LatencyWindow`
+    """
+
+    def __init__(self, window: int = 100000):
+        self.users = 0
+        self.txs = 0
+        self.batches = 0
+        self.send_latency = LatencyWindow(window)
+        self.lag = LatencyWindow(window)
+        self.started = perf_counter()
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = perf_counter() - self.started
+        return {
+            "elapsed": elapsed,
+            "users": self.users,
+            "txs": self.txs,
+            "batches": self.batches,
+            "users_per_second": self.users / elapsed if elapsed > 0 else np.nan,
+            "txs_per_second": self.txs / elapsed if elapsed > 0 else np.nan,
+            **{ f"send_{k}": v for k, v in self.send_latency.percentiles().items() },
+            **{ f"lag_{k}": v for k, v in self.lag.percentiles().items() },
+        }
+
+class LoadGenerator:
+    """
+    Sends the transactions of spawned users to a :py:class:`abm1559.loadgen.Sink` at a target rate, e.g., to soak-test a :py:class:`abm1559.live.LiveSimulation`.
+
+    Users arrive at `rate` users per second, in batches of `batch_size`. Each batch is spawned as a :py:class:`abm1559.users.UserBatch`, so values and costs follow the distributions of the user models, and users decide their transactions against `env` as they would in a :py:class:`abm1559.simulator.Simulation`. Users who balk send nothing. Supported users send :py:class:`abm1559.txs.Tx1559` (e.g., :py:class:`abm1559.users.User1559`) or :py:class:`abm1559.txs.TxFloatingEsc` (subclasses of :py:class:`abm1559.users.UserFloatingEsc`).
+
+    Messages are stamped with the arrival time of their user, in seconds since the start of the run, so that a non-realtime :py:class:`abm1559.live.LiveSimulation` seals blocks at the intended rate however fast messages are actually sent. When the sink falls behind, batches are sent as soon as possible until the schedule is caught up.
+
+    Args:
+        rate (float): Target number of users per second
+        shares (Dict[type, float]): User shares, defaults to :py:class:`abm1559.users.User1559` users only
+        batch_size (int): Number of users per batch
+        env (Dict): Environment users decide against. It is read at each batch, so passing the `env` of an in-process :py:class:`abm1559.live.LiveSimulation` lets users react to its basefee. Defaults to the initial basefee, with `current_block` advanced every `block_time` seconds.
+        block_time (float): Seconds between two blocks, used when `env` is not given
+        rng (np.random.Generator): Random number generator used to spawn users
+        config (Config): Defaults to a snapshot of :py:data:`abm1559.utils.constants`
+        stats (LoadStats): Defaults to new counters
+    """
+
+    def __init__(
+        self, rate: float, shares: Dict[type, float] = None, batch_size: int = 256,
+        env: Dict = None, block_time: float = 13, rng: np.random.Generator = rng,
+        config: Config = None, stats: LoadStats = None,
+    ):
+        self.rate = rate
+        self.shares = { User1559: 1 } if shares is None else shares
+        self.batch_size = batch_size
+        self.config = Config() if config is None else config
+        self.own_env = env is None
+        self.env = {
+            "basefee": self.config["INITIAL_BASEFEE"],
+            "current_block": 0,
+        } if env is None else env
+        self.block_time = block_time
+        self.rng = rng
+        self.stats = LoadStats() if stats is None else stats
+        self.nonce = 0
+
+    def batch(self, start: float, n: int = None) -> List[bytes]:
+        """
+        Spawns a batch of `n` users (defaults to `batch_size`) arriving from `start` seconds on, in random order, and encodes their transactions.
+        """
+
+        n = self.batch_size if n is None else n
+        if self.own_env:
+            self.env["current_block"] = int(start // self.block_time)
+
+        users = UserBatch.spawn(
+            self.env["current_block"],
+            shares_to_sizes(self.shares, n),
+            rng = self.rng,
+        )
+        order = self.rng.permutation(n)
+
+        txs, timestamps = [], []
+        for k, i in enumerate(order.tolist()):
+            tx = users[i].transact(self.env)
+            if not tx is None:
+                txs.append(tx)
+                timestamps.append(start + k / self.rate)
+
+        nonces = range(self.nonce, self.nonce + len(txs))
+        self.nonce += len(txs)
+        self.stats.users += n
+        self.stats.txs += len(txs)
+        return encode_txs(txs, nonces, timestamps)
+
+    async def run(self, sink: Sink, duration: float = None, users: int = None) -> Dict[str, float]:
+        """
+        Sends transactions to `sink` for `duration` seconds, or until `users` users were spawned, whichever comes first. At least one of them must be given.
+
+        Returns:
+            Dict[str, float]: Achieved rates and latency percentiles, see :py:meth:`abm1559.loadgen.LoadStats.summary`
+        """
+
+        if duration is None and users is None:
+            raise ValueError("Either duration or users must be given")
+
+        loop = asyncio.get_running_loop()
+        stats = self.stats
+        spawned = 0
+        await sink.open()
+        try:
+            stats.started = perf_counter()
+            origin = loop.time()
+            while users is None or spawned < users:
+                offset = spawned / self.rate
+                if not duration is None and offset >= duration:
+                    break
+                delay = origin + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                stats.lag.add([max(0, -delay)])
+
+                n = self.batch_size if users is None else min(self.batch_size, users - spawned)
+                messages = self.batch(offset, n)
+                spawned += n
+
+                start = perf_counter()
+                await sink.send(messages)
+                stats.send_latency.add([perf_counter() - start])
+                stats.batches += 1
+        except BaseException:
+            sink.abort()
+            raise
+        await sink.close()
+
+        return stats.summary()
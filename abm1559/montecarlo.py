@@ -0,0 +1,126 @@
+from typing import Sequence, Dict, Callable, Iterable, Union
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product
+import numpy as np
+import pandas as pd
+
+from abm1559 import config
+from abm1559.config import Config
+
+def seed_sequences(seeds: Union[int, Sequence[int]], entropy: int = None) -> Sequence[np.random.SeedSequence]:
+    """
+    Independent seed sequences for each path of a simulation.
+
+    Args:
+        seeds (Union[int, Sequence[int]]): Either a number of paths, spawned from a root `SeedSequence(entropy)`, or one seed per path (e.g., from :py:func:`abm1559.simulator.generate_seeds`)
+        entropy (int): Root entropy when `seeds` is a number of paths
+
+    Returns:
+        Sequence[np.random.SeedSequence]: One seed sequence per path
+    """
+
+    if isinstance(seeds, (int, np.integer)):
+        return np.random.SeedSequence(entropy).spawn(int(seeds))
+    return [np.random.SeedSequence(int(seed)) for seed in seeds]
+
+def run_path(scenario: Callable[[np.random.Generator], Iterable[Dict]], seed_sequence: np.random.SeedSequence) -> pd.DataFrame:
+    """
+    Runs `scenario` with a generator seeded by `seed_sequence`. Identifiers assigned by :py:data:`abm1559.config.ids` restart for each path, so that the path does not depend on what ran before it in the same process.
+
+    Returns:
+        pd.DataFrame: The metrics yielded by the scenario
+    """
+
+    config.ids.value = 0
+    rng = np.random.default_rng(seed_sequence)
+    return pd.DataFrame(scenario(rng))
+
+def run_paths(scenario: Callable[[np.random.Generator], Iterable[Dict]], seeds: Union[int, Sequence[int]] = 100, entropy: int = None, processes: int = None) -> Sequence[pd.DataFrame]:
+    """
+    Runs `scenario` once per seed, in a pool of `processes` worker processes.
+
+    The scenario receives a `np.random.Generator` which it should use for all randomness (e.g., pass it as `rng` to :py:class:`abm1559.simulator.Simulation`) and returns the metrics of the path, e.g., `Simulation(...).run()`. It must be picklable, i.e., a module-level function or a `functools.partial` of one. Each path only depends on its seed, so results are identical whatever the number of workers.
+
+    Args:
+        scenario (Callable[[np.random.Generator], Iterable[Dict]]): Returns the metrics of one path
+        seeds (Union[int, Sequence[int]]): Number of paths, or one seed per path
+        entropy (int): Root entropy when `seeds` is a number of paths
+        processes (int): Number of worker processes, defaults to the number of cores. With 1, paths run in the current process.
+
+    Returns:
+        Sequence[pd.DataFrame]: The metrics of each path, in seed order
+    """
+
+    sequences = seed_sequences(seeds, entropy)
+
+    if processes == 1:
+        return [run_path(scenario, sequence) for sequence in sequences]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(run_path, [scenario] * len(sequences), sequences))
+
+def aggregate_paths(paths: Sequence[pd.DataFrame], index: str = "block", quantiles: Sequence[float] = (0.05, 0.5, 0.95)) -> pd.DataFrame:
+    """
+    Mean and quantiles of each numeric metric across paths, for each value of `index`.
+
+    Returns:
+        pd.DataFrame: Indexed by `index`, with columns `(metric, statistic)`
+    """
+
+    df = pd.concat(paths, keys=range(len(paths)), names=["path", None]).reset_index(level="path")
+    grouped = df.select_dtypes("number").drop(columns=["path"]).groupby(index)
+    stats = {
+        "mean": grouped.mean(),
+        **{ f"q{q}": grouped.quantile(q) for q in quantiles },
+    }
+    return pd.concat(stats, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+def monte_carlo(scenario: Callable[[np.random.Generator], Iterable[Dict]], seeds: Union[int, Sequence[int]] = 100, entropy: int = None, processes: int = None, index: str = "block", quantiles: Sequence[float] = (0.05, 0.5, 0.95)) -> pd.DataFrame:
+    """
+    Runs `scenario` over many seeds in parallel (see :py:func:`abm1559.montecarlo.run_paths`) and aggregates the metrics across paths (see :py:func:`abm1559.montecarlo.aggregate_paths`).
+
+    Returns:
+        pd.DataFrame: Indexed by `index`, with columns `(metric, statistic)`
+    """
+
+    paths = run_paths(scenario, seeds, entropy=entropy, processes=processes)
+    return aggregate_paths(paths, index=index, quantiles=quantiles)
+
+def sweep(scenario: Callable[[Config, np.random.Generator], Iterable[Dict]], grid: Dict[str, Sequence], seeds: Union[int, Sequence[int]] = 1, entropy: int = None, processes: int = None, base_config: Config = None) -> pd.DataFrame:
+    """
+    Runs `scenario` for each combination of constants in `grid`, in parallel.
+
+    Every combination is run with the same seeds, so that differences between settings are not due to different random draws.
+
+    Args:
+        scenario (Callable[[Config, np.random.Generator], Iterable[Dict]]): Returns the metrics of one path, given its config and generator. Must be picklable.
+        grid (Dict[str, Sequence]): Values to sweep for each constant, e.g., `{ "BASEFEE_MAX_CHANGE_DENOMINATOR": [4, 8, 16] }`
+        seeds (Union[int, Sequence[int]]): Number of paths per combination, or one seed per path
+        entropy (int): Root entropy when `seeds` is a number of paths
+        processes (int): Number of worker processes, defaults to the number of cores. With 1, paths run in the current process.
+        base_config (Config): Config to which the combinations are applied, defaults to :py:data:`abm1559.utils.constants`
+
+    Returns:
+        pd.DataFrame: The metrics of all paths, with one column per constant in `grid` and a `path` column
+    """
+
+    base_config = Config() if base_config is None else base_config
+    settings = [dict(zip(grid.keys(), values)) for values in product(*grid.values())]
+    sequences = seed_sequences(seeds, entropy)
+    tasks = [
+        (partial(scenario, base_config.replace(**setting)), sequence)
+        for setting in settings for sequence in sequences
+    ]
+
+    if processes == 1:
+        paths = [run_path(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            paths = list(executor.map(run_path, *zip(*tasks)))
+
+    dfs = []
+    for i, df in enumerate(paths):
+        setting = settings[i // len(sequences)]
+        dfs.append(df.assign(**setting, path=i % len(sequences)))
+    return pd.concat(dfs, ignore_index=True)
@@ -0,0 +1,127 @@
+from typing import Sequence, Dict, Iterator, Tuple
+import numpy as np
+import pandas as pd
+
+from abm1559.config import ids
+from abm1559.txs import Tx1559
+from abm1559.simulator import Simulation, update_basefee
+
+class HistoricalBlock:
+    """
+    The transactions of a historical block, as arrays.
+
+    Args:
+        block_number (int): Block number in the history
+        gas_used (np.ndarray): Gas used by each transaction
+        gas_price (np.ndarray): Gas price of each transaction, in wei
+    """
+
+    __slots__ = ("block_number", "_gas_used", "gas_price")
+
+    def __init__(self, block_number: int, gas_used: np.ndarray, gas_price: np.ndarray):
+        self.block_number = block_number
+        self._gas_used = gas_used
+        self.gas_price = gas_price
+
+    def __len__(self):
+        return len(self._gas_used)
+
+    def gas_used(self) -> int:
+        return int(self._gas_used.sum())
+
+    def above(self, basefee: int) -> "HistoricalBlock":
+        """
+        The transactions of this block paying strictly more than `basefee`.
+        """
+        mask = self.gas_price > basefee
+        return HistoricalBlock(self.block_number, self._gas_used[mask], self.gas_price[mask])
+
+def iter_historical_blocks(csv_path: str, chunksize: int = 100000) -> Iterator[HistoricalBlock]:
+    """
+    Streams the blocks of a transaction CSV with columns `block_number`, `gas_used` and `gas_price` (in Gwei), reading `chunksize` rows at a time. Rows must be sorted by block number; a block split across two chunks is carried over to the next one.
+
+    Args:
+        csv_path (str): Path to the CSV
+        chunksize (int): Number of rows read at a time
+
+    Returns:
+        Iterator[HistoricalBlock]: The blocks, in order
+    """
+
+    carry = None
+    for chunk in pd.read_csv(csv_path, sep=",", usecols=["block_number", "gas_used", "gas_price"], chunksize=chunksize):
+        block_numbers = chunk["block_number"].to_numpy(dtype=np.int64)
+        gas_used = chunk["gas_used"].to_numpy(dtype=np.int64)
+        # gwei to wei
+        gas_price = chunk["gas_price"].to_numpy(dtype=np.float64) * (10 ** 9)
+
+        if not carry is None:
+            block_numbers = np.concatenate([carry[0], block_numbers])
+            gas_used = np.concatenate([carry[1], gas_used])
+            gas_price = np.concatenate([carry[2], gas_price])
+
+        steps = np.diff(block_numbers)
+        if (steps < 0).any():
+            raise ValueError(f"{csv_path} is not sorted by block_number")
+
+        starts = np.concatenate([[0], np.flatnonzero(steps) + 1])
+        # The last block may continue in the next chunk
+        for start, end in zip(starts[:-1], starts[1:]):
+            yield HistoricalBlock(int(block_numbers[start]), gas_used[start:end], gas_price[start:end])
+        last = starts[-1]
+        carry = (block_numbers[last:], gas_used[last:], gas_price[last:])
+
+    if not carry is None and len(carry[0]) > 0:
+        yield HistoricalBlock(int(carry[0][0]), carry[1], carry[2])
+
+def replay_basefee(initial_basefee: int, csv_path: str, chunksize: int = 100000, config=None) -> Iterator[Tuple[int, int, int]]:
+    """
+    Replays a transaction history under EIP-1559: at each block, only transactions whose gas price exceeds the current basefee are included, and the basefee is updated from their gas.
+
+    Returns:
+        Iterator[Tuple[int, int, int]]: For each block, its number, the basefee it was replayed at and the gas it included
+    """
+
+    basefee = initial_basefee
+    for block in iter_historical_blocks(csv_path, chunksize=chunksize):
+        included = block.above(basefee)
+        yield (block.block_number, basefee, included.gas_used())
+        basefee = update_basefee(included, basefee, config=config)
+
+class ReplaySimulation(Simulation):
+    """
+    A :py:class:`abm1559.simulator.Simulation` whose demand is a transaction history rather than spawned users. At each simulated block, the transactions of the next historical block paying more than the current basefee are sent to the pool as :py:class:`abm1559.txs.Tx1559` with `max_fee` and `gas_premium` both set to their historical gas price.
+
+    The simulation runs until the history is exhausted, or for `blocks` blocks if given to :py:meth:`run`.
+
+    Args:
+        csv_path (str): Transaction CSV, see :py:func:`abm1559.replay.iter_historical_blocks`
+        chunksize (int): Number of rows read at a time
+        **kwargs: Passed on to :py:class:`abm1559.simulator.Simulation`
+    """
+
+    def __init__(self, csv_path: str, chunksize: int = 100000, **kwargs):
+        super().__init__([], **kwargs)
+        self.historical_blocks = iter_historical_blocks(csv_path, chunksize=chunksize)
+        self.next_block = next(self.historical_blocks, None)
+
+    def spawn_users(self, t: int) -> Sequence:
+        return []
+
+    def decide_transactions(self, users: Sequence) -> Sequence:
+        block = self.next_block.above(self.env["basefee"])
+        self.next_block = next(self.historical_blocks, None)
+
+        t = self.env["current_block"]
+        return [
+            Tx1559(
+                sender = ids(),
+                tx_params = { "start_block": t, "gas_premium": gas_price, "max_fee": gas_price },
+                gas_used = int(gas_used), tx_hash = ids(),
+            ) for gas_used, gas_price in zip(block._gas_used, block.gas_price.tolist())
+        ]
+
+    def run(self, blocks: int = None) -> Iterator[Dict]:
+        end = None if blocks is None else self.t + blocks
+        while not self.next_block is None and (end is None or self.t < end):
+            yield self.step()
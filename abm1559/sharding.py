@@ -0,0 +1,173 @@
+import multiprocessing
+import traceback
+from threading import BrokenBarrierError
+from typing import Sequence, Dict, Callable, Iterator, Union
+import numpy as np
+import pandas as pd
+
+from abm1559 import config
+from abm1559.montecarlo import seed_sequences
+
+# Per-block metrics of each shard gathered by default, aggregated by the shard's chain (see :py:data:`abm1559.chain.chain_metrics`)
+SHARD_METRICS = ("basefee", "gas_used", "blob_gas_used")
+
+class ShardView:
+    """
+    The per-block metrics of all shards, as `(shards, blocks)` arrays backed by shared memory. Each shard of a :py:class:`abm1559.sharding.ShardedSimulation` receives one as its `shards` attribute, e.g., so that its basefee may depend on the blob gas of every shard.
+
+    While a shard simulates block `t`, the metrics of all shards are complete up to block `t - 1`. Metrics use the units of the chain (e.g., basefee in wei).
+    """
+
+    def __init__(self, buffer, names: Sequence[str], shards: int, blocks: int, shard: int = None):
+        self.names = list(names)
+        self.shard = shard
+        array = np.frombuffer(buffer, dtype=np.float64).reshape(len(names), shards, blocks)
+        self.values = { name: array[i] for i, name in enumerate(names) }
+
+    def total(self, name: str, block: int) -> float:
+        """
+        Sum of metric `name` over all shards at `block`.
+        """
+        return self.values[name][:, block].sum()
+
+def _sync_shard(simulation, view: ShardView, synced: int) -> int:
+    # Copies the metrics of blocks added or modified since the last sync (see `Chain.add_to_metric`)
+    chain = simulation.chain
+    n = len(chain.heights)
+    start = min(synced, max(chain.modified_from.get("sharding", 0) - 1, 0))
+    for name in view.names:
+        totals = np.frombuffer(chain.totals[name], dtype=np.float64)
+        view.values[name][view.shard, start:n] = np.diff(totals[start:n + 1])
+    chain.modified_from["sharding"] = n + 1
+    return n
+
+def _run_shard(factory, shard, seed_sequence, blocks, names, shards, buffer, barrier, results):
+    try:
+        config.ids.value = 0
+        rng = np.random.default_rng(seed_sequence)
+        simulation = factory(shard, rng)
+        view = ShardView(buffer, names, shards, blocks, shard=shard)
+        simulation.shards = view
+
+        rows = []
+        synced = 0
+        for t in range(blocks):
+            rows.append(simulation.step())
+            # Shards only write to shared memory while no shard is simulating
+            barrier.wait()
+            synced = _sync_shard(simulation, view, synced)
+            barrier.wait()
+        results.put((shard, pd.DataFrame(rows), None))
+    except BrokenBarrierError:
+        results.put((shard, None, None))
+    except Exception:
+        barrier.abort()
+        results.put((shard, None, traceback.format_exc()))
+
+class ShardedSimulation:
+    """
+    Simulates `shards` shards in parallel, each in its own worker process with its own transaction pool, user pool and chain, e.g., to study the blob publication of the sharding notebook at scale.
+
+    Each shard is a :py:class:`abm1559.simulator.Simulation` returned by `factory(shard, rng)`, which must be picklable (a module-level function or a `functools.partial` of one), as for :py:func:`abm1559.montecarlo.run_paths`. Shards advance in lockstep, synchronised by a barrier after each block. Their per-block metrics (`metrics`, by default basefee, gas used and blob gas used) are then copied to arrays in shared memory, which all shards may read through their `shards` attribute (see :py:class:`abm1559.sharding.ShardView`) and from which cross-shard aggregates are computed, so that no block or transaction is pickled between processes.
+
+    Args:
+        factory (Callable[[int, np.random.Generator], Simulation]): Returns the simulation of a shard given its index and generator
+        shards (int): Number of shards
+        blocks (int): Number of blocks to simulate
+        seeds (Union[int, Sequence[int]]): One seed per shard, defaults to seeds spawned from `entropy`
+        entropy (int): Root entropy when `seeds` is not given
+        metrics (Sequence[str]): Chain metrics gathered from each shard
+        timeout (float): Seconds to wait for the slowest shard at each block before giving up, defaults to no timeout
+        mp_context: `multiprocessing` context used to start workers, defaults to the default context
+    """
+
+    def __init__(
+        self, factory: Callable, shards: int, blocks: int,
+        seeds: Union[int, Sequence[int]] = None, entropy: int = None,
+        metrics: Sequence[str] = SHARD_METRICS, timeout: float = None, mp_context=None,
+    ):
+        self.factory = factory
+        self.shards = shards
+        self.blocks = blocks
+        self.seed_sequences = seed_sequences(shards if seeds is None else seeds, entropy)
+        if len(self.seed_sequences) != shards:
+            raise ValueError(f"Expected {shards} seeds, got {len(self.seed_sequences)}")
+        self.names = list(metrics)
+        self.timeout = timeout
+        self.context = multiprocessing.get_context() if mp_context is None else mp_context
+
+        self.view = None
+        # Metrics yielded by the simulation of each shard, once run
+        self.shard_metrics = None
+
+    def aggregate(self, t: int) -> Dict:
+        """
+        Cross-shard aggregates of block `t`: the sum and mean of each metric over shards.
+        """
+        row = { "block": t }
+        for name in self.names:
+            values = self.view.values[name][:, t]
+            row[f"{name}_total"] = values.sum()
+            row[f"{name}_mean"] = values.mean()
+        return row
+
+    def run(self) -> Iterator[Dict]:
+        """
+        Starts one worker per shard and simulates all blocks.
+
+        Workers wait for each row to be consumed before simulating the next block. A row gives the metrics of block `t` as of the end of block `t`; later changes (e.g., blobs published after their block was added) are found in :py:meth:`export`.
+
+        Returns:
+            Iterator[Dict]: Cross-shard aggregates of each block, see :py:meth:`aggregate`
+        """
+
+        context = self.context
+        buffer = context.RawArray("d", len(self.names) * self.shards * self.blocks)
+        self.view = ShardView(buffer, self.names, self.shards, self.blocks)
+        # Workers and this process
+        barrier = context.Barrier(self.shards + 1, timeout=self.timeout)
+        results = context.Queue()
+
+        workers = [
+            context.Process(
+                target = _run_shard,
+                args = (self.factory, shard, sequence, self.blocks, self.names, self.shards, buffer, barrier, results),
+                daemon = True,
+            ) for shard, sequence in enumerate(self.seed_sequences)
+        ]
+        for worker in workers:
+            worker.start()
+
+        completed = False
+        try:
+            for t in range(self.blocks):
+                barrier.wait()
+                barrier.wait()
+                yield self.aggregate(t)
+            completed = True
+        except BrokenBarrierError:
+            pass
+        finally:
+            if not completed:
+                barrier.abort()
+            outcomes = sorted([results.get() for _ in workers], key=lambda outcome: outcome[0])
+            for worker in workers:
+                worker.join()
+
+        errors = [error for _, _, error in outcomes if not error is None]
+        if len(errors) > 0:
+            raise RuntimeError(f"A shard failed:\n{errors[0]}")
+        if not completed:
+            raise RuntimeError("Shards timed out")
+        self.shard_metrics = [metrics for _, metrics, _ in outcomes]
+
+    def export(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: The metrics of each shard at each block, with columns `shard` and `block`
+        """
+        return pd.DataFrame({
+            "shard": np.repeat(np.arange(self.shards), self.blocks),
+            "block": np.tile(np.arange(self.blocks), self.shards),
+            **{ name: values.ravel() for name, values in self.view.values.items() },
+        })
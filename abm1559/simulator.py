@@ -1,16 +1,28 @@
-from typing import Sequence, Dict
+from typing import Sequence, Dict, Callable, Iterator, Tuple
 import numpy as np
+import pandas as pd
 
-from abm1559.config import rng
+from abm1559.config import rng, Config, RngStreams
+from abm1559.timing import PhaseTimer
+from abm1559 import demand
+from abm1559.amm import excess_gas_for_basefee, marginal_basefee, update_excess_gas
 
 from abm1559.utils import (
     constants,
+    accepted_kwargs,
 )
 
-from abm1559.chain import Block
-from abm1559.users import User, User1559
+from abm1559.chain import (
+    Block,
+    Block1559,
+    BlockAMMImplied,
+    Chain,
+)
+from abm1559.txpool import TxPool
+from abm1559.userpool import UserPool
+from abm1559.users import User, User1559, UserBatch
 
-def spawn_poisson_demand(timestep: int, demand_lambda: float, UserClass, rng: np.random.Generator = rng, **kwargs) -> Sequence[User]:
+def spawn_poisson_demand(timestep: int, demand_lambda: float, UserClass, rng: np.random.Generator = rng, demand_rng: np.random.Generator = None, **kwargs) -> Sequence[User]:
     """
     One-step demand from homogeneous users, with demand size drawn from a Poisson distribution.
 
@@ -18,16 +30,18 @@ def spawn_poisson_demand(timestep: int, demand_lambda: float, UserClass, rng: np
         timestep (int): Current round
         demand_lambda (float): Rate of arrival, the :math:`lambda` parameter of a Poisson distribution
         UserClass (class): The user type
+        rng (np.random.Generator): Passed on to new users
+        demand_rng (np.random.Generator): Draws the demand size, defaults to `rng`
 
     Returns:
         Sequence[User]: An array of users
     """
     
-    demand_size = rng.poisson(demand_lambda)
+    demand_size = (rng if demand_rng is None else demand_rng).poisson(demand_lambda)
     new_users = [UserClass(timestep, rng=rng, **kwargs) for i in range(demand_size)]
     return new_users
 
-def spawn_poisson_heterogeneous_demand(timestep: int, demand_lambda: float, shares: Dict[type, float], rng: np.random.Generator = rng) -> Sequence[User]:
+def spawn_poisson_heterogeneous_demand(timestep: int, demand_lambda: float, shares: Dict[type, float], rng: np.random.Generator = rng, demand_rng: np.random.Generator = None, id_rng: np.random.Generator = None) -> Sequence[User]:
     """
     One-step demand from heterogeneous users, with demand size drawn from a Poisson distribution.
 
@@ -35,19 +49,22 @@ def spawn_poisson_heterogeneous_demand(timestep: int, demand_lambda: float, shar
         timestep (int): Current round
         demand_lambda (float): Rate of arrival, the :math:`lambda` parameter of a Poisson distribution
         shares (Dict[type, float]): Keys are user classes (subclasses of :py:class:`abm1559.users.User`), values are the share of each user class to spawn this round. Shares are expected to sum to 1.
+        rng (np.random.Generator): Passed on to new users
+        demand_rng (np.random.Generator): Draws the demand size, defaults to `rng`
+        id_rng (np.random.Generator): Passed on to new users, draws their public keys and transaction hashes
 
     Returns:
         Sequence[User]: An array of users
     """
 
     new_users = []
-    demand_size = rng.poisson(demand_lambda)
+    demand_size = (rng if demand_rng is None else demand_rng).poisson(demand_lambda)
     sizes = shares_to_sizes(shares, demand_size)
     for UserClass, size in sizes.items():
-        new_users += [UserClass(timestep, rng=rng) for i in range(size)]
+        new_users += [UserClass(timestep, rng=rng, id_rng=id_rng) for i in range(size)]
     return new_users
 
-def spawn_fixed_heterogeneous_demand(timestep: int, demand_lambda: float, shares: Dict[type, float], rng: np.random.Generator = rng) -> Sequence[User]:
+def spawn_fixed_heterogeneous_demand(timestep: int, demand_lambda: float, shares: Dict[type, float], rng: np.random.Generator = rng, demand_rng: np.random.Generator = None, id_rng: np.random.Generator = None) -> Sequence[User]:
     """
     One-step demand from heterogeneous users, with demand size fixed to `demand_lambda`.
 
@@ -55,6 +72,9 @@ def spawn_fixed_heterogeneous_demand(timestep: int, demand_lambda: float, shares
         timestep (int): Current round
         demand_lambda (float): Rate of arrival
         shares (Dict[type, float]): Keys are user classes (subclasses of :py:class:`abm1559.users.User`), values are the share of each user class to spawn this round. Shares are expected to sum to 1.
+        rng (np.random.Generator): Passed on to new users
+        demand_rng (np.random.Generator): Draws the demand size, defaults to `rng`
+        id_rng (np.random.Generator): Passed on to new users, draws their public keys and transaction hashes
 
     Returns:
         Sequence[User]: An array of users
@@ -64,9 +84,25 @@ def spawn_fixed_heterogeneous_demand(timestep: int, demand_lambda: float, shares
     demand_size = demand_lambda
     sizes = shares_to_sizes(shares, demand_size)
     for UserClass, size in sizes.items():
-        new_users += [UserClass(timestep, rng=rng) for i in range(size)]
+        new_users += [UserClass(timestep, rng=rng, id_rng=id_rng) for i in range(size)]
     return new_users
 
+def spawn_poisson_demand_batch(timestep: int, demand_lambda: float, UserClass, rng: np.random.Generator = rng, demand_rng: np.random.Generator = None, id_rng: np.random.Generator = None) -> UserBatch:
+    """
+    Same as :py:func:`abm1559.simulator.spawn_poisson_demand`, with the randomness of all new users drawn at once in a :py:class:`abm1559.users.UserBatch`.
+    """
+
+    demand_size = (rng if demand_rng is None else demand_rng).poisson(demand_lambda)
+    return UserBatch.spawn(timestep, { UserClass: demand_size }, rng=rng, id_rng=id_rng)
+
+def spawn_poisson_heterogeneous_demand_batch(timestep: int, demand_lambda: float, shares: Dict[type, float], rng: np.random.Generator = rng, demand_rng: np.random.Generator = None, id_rng: np.random.Generator = None) -> UserBatch:
+    """
+    Same as :py:func:`abm1559.simulator.spawn_poisson_heterogeneous_demand`, with the randomness of all new users drawn at once in a :py:class:`abm1559.users.UserBatch`.
+    """
+
+    demand_size = (rng if demand_rng is None else demand_rng).poisson(demand_lambda)
+    return UserBatch.spawn(timestep, shares_to_sizes(shares, demand_size), rng=rng, id_rng=id_rng)
+
 def shares_to_sizes(shares: Dict[type, float], demand_size: int) -> Dict[type, int]:
     new_sizes = {}
     for i, (UserClass, share) in enumerate(shares.items()):
@@ -76,31 +112,281 @@ def shares_to_sizes(shares: Dict[type, float], demand_size: int) -> Dict[type, i
             new_sizes[UserClass] = int(share * demand_size)
     return new_sizes
 
-def update_basefee(block: Block, basefee: int) -> int:
+def update_basefee(block: Block, basefee: int, config=None) -> int:
     """
     Basefee update rule
 
     Args:
         block (Block): The previous block
         basefee (int): The current basefee
+        config (Config): Protocol constants (see :py:class:`abm1559.config.Config`), defaults to :py:data:`abm1559.utils.constants`
 
     Returns:
         int: The new basefee
     """
 
-    gas_used = sum([tx.gas_used for tx in block.txs])
-    if gas_used == constants["TARGET_GAS_USED"]:
+    config = constants if config is None else config
+    gas_used = block.gas_used()
+    if gas_used == config["TARGET_GAS_USED"]:
         new_basefee = basefee
-    elif gas_used > constants["TARGET_GAS_USED"]:
-        gas_delta = gas_used - constants["TARGET_GAS_USED"]
-        fee_delta = max(basefee * gas_delta // constants["TARGET_GAS_USED"] // constants["BASEFEE_MAX_CHANGE_DENOMINATOR"], 1)
+    elif gas_used > config["TARGET_GAS_USED"]:
+        gas_delta = gas_used - config["TARGET_GAS_USED"]
+        fee_delta = max(basefee * gas_delta // config["TARGET_GAS_USED"] // config["BASEFEE_MAX_CHANGE_DENOMINATOR"], 1)
         new_basefee = basefee + fee_delta
     else:
-        gas_delta = constants["TARGET_GAS_USED"] - gas_used
-        fee_delta = basefee * gas_delta // constants["TARGET_GAS_USED"] // constants["BASEFEE_MAX_CHANGE_DENOMINATOR"]
+        gas_delta = config["TARGET_GAS_USED"] - gas_used
+        fee_delta = basefee * gas_delta // config["TARGET_GAS_USED"] // config["BASEFEE_MAX_CHANGE_DENOMINATOR"]
         new_basefee = basefee - fee_delta
     return new_basefee
 
+class Simulation:
+    """
+    The simulation loop shared by our notebooks. At each block, new users are spawned and decide whether to transact, their transactions are added to the pool, the best ones are included in a new block and the basefee is updated.
+
+    :py:meth:`run` is a generator yielding one row of metrics per block, so that long simulations can be consumed incrementally. The components (transaction pool, user pool, chain, block class, basefee update rule) are set at construction, while each phase of the loop is a method which subclasses may override, e.g., to cancel transactions or publish blobs after the block is added.
+
+    Args:
+        demand_scenario (Sequence[float]): Expected number of new users at each block
+        shares_scenario (Sequence[Dict[type, float]]): User shares at each block, or a single `Dict` used for every block. Defaults to :py:class:`abm1559.users.User1559` users only.
+        txpool (TxPool): Defaults to a new :py:class:`abm1559.txpool.TxPool`
+        user_pool (UserPool): Defaults to a new :py:class:`abm1559.userpool.UserPool`
+        chain (Chain): Defaults to a new :py:class:`abm1559.chain.Chain`
+        BlockClass (class): Built with `txs`, `parent_hash`, `height` and `basefee`
+        basefee_update_fn (Callable): Called with `(block, basefee)`, and `config=config` if it accepts it, returns the next basefee given the new block and the current basefee
+        spawn_fn (Callable): Called with `(timestep, demand_lambda, shares, rng=rng)`, returns the new users. When the simulation is seeded, also called with `demand_rng` and `id_rng` if it accepts them, otherwise these draws come from `rng`.
+        extra_metrics (Callable): Called with `(env, users, user_pool, txpool)`, returns a `Dict` merged into each row of metrics
+        env (Dict): Additional environment parameters (e.g., `min_premium`), `basefee` may be set to override the initial basefee
+        query_all (bool): Should all users in the pool be queried at each block, or new incoming users only?
+        rng (np.random.Generator): Random number generator used to spawn users, draw identifiers and break ties between transactions
+        seed: If given, an integer or `np.random.SeedSequence` from which independent streams are derived for each of these (see :py:class:`abm1559.config.RngStreams`), in place of `rng`
+        config (Config): Protocol constants of this simulation, defaults to a snapshot of :py:data:`abm1559.utils.constants`
+        timer (PhaseTimer): Times each phase of :py:meth:`step`, defaults to a disabled :py:class:`abm1559.timing.PhaseTimer` which may be enabled at any time with `simulation.timer.enabled = True`
+    """
+
+    def __init__(
+        self, demand_scenario: Sequence[float], shares_scenario=None,
+        txpool: TxPool = None, user_pool: UserPool = None, chain: Chain = None,
+        BlockClass=Block1559, basefee_update_fn: Callable = None,
+        spawn_fn: Callable = None, extra_metrics: Callable = None,
+        env: Dict = None, query_all: bool = False, rng: np.random.Generator = rng,
+        config: Config = None, timer: PhaseTimer = None, seed=None,
+    ):
+        self.demand_scenario = demand_scenario
+        self.shares_scenario = { User1559: 1 } if shares_scenario is None else shares_scenario
+        self.txpool = TxPool() if txpool is None else txpool
+        self.user_pool = UserPool() if user_pool is None else user_pool
+        self.chain = Chain() if chain is None else chain
+        self.BlockClass = BlockClass
+        self.basefee_update_fn = update_basefee if basefee_update_fn is None else basefee_update_fn
+        self.spawn_fn = spawn_poisson_heterogeneous_demand if spawn_fn is None else spawn_fn
+        self.extra_metrics = extra_metrics
+        self.query_all = query_all
+
+        # Generators of each component, all `rng` unless the simulation is seeded
+        self.streams = None if seed is None else RngStreams(seed)
+        if self.streams is None:
+            self.rng = self.demand_rng = self.id_rng = self.tiebreak_rng = rng
+        else:
+            self.rng = self.streams["values"]
+            self.demand_rng = self.streams["demand"]
+            self.id_rng = self.streams["ids"]
+            self.tiebreak_rng = self.streams["tiebreak"]
+        self.config = Config() if config is None else config
+        self.timer = PhaseTimer(enabled=False) if timer is None else timer
+
+        # `env` is the "environment" of the simulation
+        self.env = {
+            "basefee": self.config["INITIAL_BASEFEE"],
+            "current_block": None,
+            **({} if env is None else env),
+        }
+
+        # Next block to simulate
+        self.t = 0
+
+    def shares(self, t: int) -> Dict[type, float]:
+        if isinstance(self.shares_scenario, dict):
+            return self.shares_scenario
+        return self.shares_scenario[t]
+
+    def spawn_users(self, t: int) -> Sequence[User]:
+        if self.streams is None:
+            return self.spawn_fn(t, self.demand_scenario[t], self.shares(t), rng=self.rng)
+        return self.spawn_fn(
+            t, self.demand_scenario[t], self.shares(t), rng=self.rng,
+            **accepted_kwargs(self.spawn_fn, demand_rng=self.demand_rng, id_rng=self.id_rng),
+        )
+
+    def generators(self) -> Dict[str, np.random.Generator]:
+        """
+        The generators of this simulation, by role.
+        """
+        return {
+            "rng": self.rng,
+            "demand_rng": self.demand_rng,
+            "id_rng": self.id_rng,
+            "tiebreak_rng": self.tiebreak_rng,
+        }
+
+    def decide_transactions(self, users: Sequence[User]) -> Sequence:
+        decided_txs = self.user_pool.decide_transactions(users, self.env, query_all=self.query_all)
+        if not self.query_all:
+            # Users who balked are not queried again
+            self.user_pool.retire_users([user.pub_key for user in users if not user.pub_key in self.user_pool.pending_users])
+        return decided_txs
+
+    def add_txs(self, txs: Sequence) -> Sequence:
+        # Pools with limited capacity return the transactions they evicted
+        evicted_txs = self.txpool.add_txs(txs, self.env)
+        return [] if evicted_txs is None else evicted_txs
+
+    def select_transactions(self) -> Sequence:
+        select = self.txpool.select_transactions
+        selected_txs = select(self.env, rng=self.tiebreak_rng, **accepted_kwargs(select, config=self.config))
+        self.txpool.remove_txs([tx.tx_hash for tx in selected_txs])
+        # Included users are no longer queried
+        self.user_pool.retire_users([tx.sender for tx in selected_txs])
+        return selected_txs
+
+    def build_block(self, txs: Sequence) -> Block:
+        return self.BlockClass(
+            txs = txs, parent_hash = self.chain.current_head,
+            height = self.env["current_block"], basefee = self.env["basefee"],
+            rng = self.id_rng,
+        )
+
+    def update_basefee(self, block: Block) -> int:
+        update = self.basefee_update_fn
+        return update(block, self.env["basefee"], **accepted_kwargs(update, config=self.config))
+
+    def metrics(self, block: Block, users: Sequence[User], decided_txs: Sequence, evicted_txs: Sequence) -> Dict:
+        row_metrics = {
+            "block": self.env["current_block"],
+            "users": len(users),
+            "decided_txs": len(decided_txs),
+            "pool_limit_evictions": len(evicted_txs),
+            "included_txs": len(block.txs),
+            "basefee": self.env["basefee"] / (10 ** 9), # to Gwei
+            "gas_used": block.gas_used(),
+            "blk_avg_gas_price": block.average_gas_price(),
+            "blk_avg_tip": block.average_tip(),
+            "blk_avg_waiting_time": block.average_waiting_time(),
+            "pool_length": self.txpool.pool_length(),
+        }
+
+        if not self.extra_metrics is None:
+            row_metrics = {
+                **row_metrics,
+                **self.extra_metrics(self.env, users, self.user_pool, self.txpool),
+            }
+
+        return row_metrics
+
+    def step(self) -> Dict:
+        """
+        Simulates the next block.
+
+        Returns:
+            Dict: The metrics of the new block
+        """
+
+        t = self.t
+        self.env["current_block"] = t
+        timer = self.timer
+        timer.start(t)
+
+        # We return some demand which on expectation yields `demand_scenario[t]` new users per round
+        users = self.spawn_users(t)
+        timer.lap("spawn_users")
+
+        # Add new users to the pool
+        # Users either return a transaction or None if they prefer to balk
+        decided_txs = self.decide_transactions(users)
+        timer.lap("decide_transactions")
+
+        # New transactions are added to the transaction pool
+        evicted_txs = self.add_txs(decided_txs)
+        timer.lap("add_txs")
+        if timer.enabled:
+            timer.count("pool_length", self.txpool.pool_length())
+
+        # The best valid transactions are taken out of the pool for inclusion
+        selected_txs = self.select_transactions()
+        timer.lap("select_transactions")
+
+        # We create a block with these transactions and add it to the chain
+        block = self.build_block(selected_txs)
+        timer.lap("build_block")
+        self.chain.add_block(block)
+        timer.lap("add_block")
+
+        row_metrics = self.metrics(block, users, decided_txs, evicted_txs)
+        timer.lap("metrics")
+
+        # Finally, basefee is updated and a new round starts
+        self.env["basefee"] = self.update_basefee(block)
+        timer.lap("update_basefee")
+        self.t += 1
+
+        return row_metrics
+
+    def run(self, blocks: int = None) -> Iterator[Dict]:
+        """
+        Simulates blocks until the end of the demand scenario, or `blocks` blocks if given, resuming from the last simulated block.
+
+        Args:
+            blocks (int): Maximum number of blocks to simulate
+
+        Returns:
+            Iterator[Dict]: The metrics of each new block
+        """
+
+        end = len(self.demand_scenario)
+        if not blocks is None:
+            end = min(end, self.t + blocks)
+
+        while self.t < end:
+            yield self.step()
+
+class AMMSimulation(Simulation):
+    """
+    A :py:class:`abm1559.simulator.Simulation` of the AMM design: blocks are :py:class:`abm1559.chain.BlockAMMImplied` and the basefee seen by users is the marginal basefee. The excess gas issued is tracked in `env["excess_gas_issued"]`, updated after each block.
+
+    Args:
+        excess_gas_issued (float): Initial excess gas issued, defaults to the one whose marginal basefee is the initial basefee
+        **kwargs: Passed on to :py:class:`abm1559.simulator.Simulation`
+    """
+
+    def __init__(self, demand_scenario, shares_scenario=None, excess_gas_issued: float = None, **kwargs):
+        super().__init__(demand_scenario, shares_scenario, BlockClass=BlockAMMImplied, **kwargs)
+        if excess_gas_issued is None:
+            excess_gas_issued = float(excess_gas_for_basefee(self.env["basefee"], self.config))
+        self.env["excess_gas_issued"] = excess_gas_issued
+        self.env["basefee"] = marginal_basefee(excess_gas_issued, self.config)
+
+    def build_block(self, txs) -> Block:
+        return self.BlockClass(
+            txs = txs, parent_hash = self.chain.current_head,
+            height = self.env["current_block"], excess_gas_issued = self.env["excess_gas_issued"],
+            config = self.config, rng = self.id_rng,
+        )
+
+    def update_basefee(self, block: Block) -> float:
+        self.env["excess_gas_issued"] = update_excess_gas(self.env["excess_gas_issued"], block.gas_used(), self.config)
+        return marginal_basefee(self.env["excess_gas_issued"], self.config)
+
+def simulate(demand_scenario: Sequence[float], shares_scenario=None, **kwargs) -> Tuple[pd.DataFrame, UserPool, Chain]:
+    """
+    Runs a :py:class:`abm1559.simulator.Simulation` to the end of `demand_scenario`.
+
+    Returns:
+        Tuple[pd.DataFrame, UserPool, Chain]: The metrics, user pool and chain of the simulation
+    """
+
+    simulation = Simulation(demand_scenario, shares_scenario, **kwargs)
+    df = pd.DataFrame(simulation.run())
+    return (df, simulation.user_pool, simulation.chain)
+
 def generate_seeds(seeds: int = 100, rng: np.random.Generator = rng):
     return rng.integers(low=0, high=seeds*1000, size=seeds)
 
@@ -121,39 +407,14 @@ def generate_gbm(lambda_0: float, T: int, paths: int = 1, mu: float = 0.5, sigma
     return S
 
 def apply_block_time_variance(demand_process: Sequence[float], blocks: int, mean_ia_time: float = 13, rng: np.random.Generator = rng) -> Sequence[int]:
-    # Block time differences are distributed along a Poisson(13)
-    ia_times = rng.exponential(13, blocks)
-    demand_per_block = []
-    current_time = 0
-    for block_index, ia_time in enumerate(ia_times):
-        ia_time = int(ia_time)
-        new_demand = 0
-        for t in range(current_time, current_time + ia_time):
-            new_demand += demand_process[t]
-        demand_per_block += [int(new_demand)]
-        current_time += ia_time
-    return demand_per_block
+    # Block time differences are distributed along an Exponential(mean_ia_time)
+    return demand.apply_block_time_variance(demand_process, blocks, mean_ia_time=mean_ia_time, rng=rng).tolist()
 
 def generate_poisson_process(l: float, duration: float, rng: np.random.Generator) -> Sequence[float]:
     """
     Generates a Poisson arrival process of rate `l` and duration `duration`.
     """
-    t = 0
-    ia_times = []
-    while t < duration:
-        ia_time = rng.exponential(1.0 / l)
-        t += ia_time
-        ia_times += [t]
-        
-    return ia_times
+    return demand.poisson_process(l, duration, rng=rng).tolist()
 
 def generate_jump_process(pp: Sequence[float], duration: int, jump_mean: float, rng: np.random.Generator, discount: float = 0.0):
-    jp = []
-    current_jump = 0
-    for k in range(duration):
-        jumps = [int(t) for t in pp if int(t) == k]
-        for jump in jumps:
-            current_jump += rng.exponential(jump_mean)
-        jp += [current_jump]
-        current_jump *= (1-discount)
-    return np.array(jp)
\ No newline at end of file
+    return demand.jump_process(pp, duration, jump_mean, rng=rng, discount=discount)
\ No newline at end of file
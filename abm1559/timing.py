@@ -0,0 +1,78 @@
+from time import perf_counter
+from typing import Dict
+import pandas as pd
+
+class PhaseTimer:
+    """
+    Times the phases of each block of a simulation, e.g., spawning users or selecting transactions (see :py:meth:`abm1559.simulator.Simulation.step`), and counts events within the block.
+
+    Each phase is timed by a call to :py:meth:`lap` at its end, which records the time elapsed since the previous lap. When `enabled` is unset, which may be done at any time, laps and counts return immediately.
+
+    Args:
+        enabled (bool): Should blocks be timed?
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.rows = []
+        # Names of the phases seen so far, in order
+        self.phases = {}
+        # Row of the block being timed, if any
+        self._row = None
+        self._last = 0.0
+
+    def start(self, block: int) -> None:
+        """
+        Starts timing a new block.
+        """
+        if not self.enabled:
+            self._row = None
+            return
+        self._row = { "block": block }
+        self.rows.append(self._row)
+        self._last = perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """
+        Adds the time elapsed since the previous lap to `phase`.
+        """
+        if self._row is None:
+            return
+        now = perf_counter()
+        self._row[phase] = self._row.get(phase, 0.0) + now - self._last
+        self.phases[phase] = None
+        self._last = now
+
+    def count(self, name: str, n: int = 1) -> None:
+        """
+        Adds `n` to the counter `name` of the current block.
+        """
+        if self._row is None:
+            return
+        self._row[name] = self._row.get(name, 0) + n
+
+    def reset(self) -> None:
+        self.rows = []
+        self.phases = {}
+        self._row = None
+
+    def export(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: One row per timed block, with the time spent in each phase (in seconds) and the counters, to be merged with the metrics on `block`
+        """
+        return pd.DataFrame(self.rows)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: Total and mean time per block spent in each phase, and its share of the total
+        """
+        df = self.export()
+        phases = list(self.phases)
+        totals = df[phases].sum()
+        return pd.DataFrame({
+            "total": totals,
+            "mean": df[phases].mean(),
+            "share": totals / totals.sum(),
+        })
@@ -1,8 +1,13 @@
-from typing import Sequence
+from typing import Sequence, Iterator, Tuple
+from bisect import bisect_left, bisect_right, insort
+import heapq
+
+import numpy as np
 
 from abm1559.config import rng
 
-from abm1559.txs import Transaction
+from abm1559.txs import Transaction, TxEscalator
+from abm1559.builder import pack
 
 from abm1559.utils import (
     constants,
@@ -19,12 +24,13 @@ class TxPool:
     def pool_length(self) -> int:
         return len(self.txs)
 
-    def add_txs(self, txs: Sequence[Transaction]) -> None:
+    def add_txs(self, txs: Sequence[Transaction], env=None) -> None:
         """
         Adds `txs` to the queue.
 
         Args:
             txs (Sequence[Transaction]): The transactions to add
+            env (Dict): Current simulation environment, unused here but available to subclasses (e.g., pools evicting by tip)
 
         Returns:
             None
@@ -79,9 +85,10 @@ class TxPool:
         else:
             return sum([tx.gas_price(env) for tx in self.txs.values()]) / self.pool_length() / (10 ** 9)
 
-    def select_transactions(self, env, user_pool=None, rng=rng):
+    def select_transactions(self, env, user_pool=None, rng=rng, config=None):
         # Miner side
-        max_tx_in_block = int(constants["MAX_GAS_EIP1559"] / constants["SIMPLE_TRANSACTION_GAS"])
+        config = constants if config is None else config
+        max_tx_in_block = int(config["MAX_GAS_EIP1559"] / config["SIMPLE_TRANSACTION_GAS"])
 
         valid_txs = [tx for tx in self.txs.values() if tx.is_valid(env)]
         rng.shuffle(valid_txs)
@@ -106,3 +113,762 @@ class TxPool:
 
     def __str__(self):
         return "\n".join([tx.__str__() for tx in self.txs.values()])
+
+class _SortedList:
+    """
+    A sorted list of tuples, split into buckets of bounded size so that insertions and removals only shift a single bucket.
+
+    Positions are given as `(bucket, index)` pairs, the end of the list being `(len(buckets), 0)`.
+    """
+
+    _load = 1000
+
+    def __init__(self):
+        self._lists = []
+        self._maxes = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, value) -> None:
+        if len(self._maxes) == 0:
+            self._lists.append([value])
+            self._maxes.append(value)
+        else:
+            i = bisect_left(self._maxes, value)
+            if i == len(self._maxes):
+                i -= 1
+                self._lists[i].append(value)
+                self._maxes[i] = value
+            else:
+                insort(self._lists[i], value)
+            lst = self._lists[i]
+            if len(lst) > 2 * self._load:
+                self._lists.insert(i + 1, lst[self._load:])
+                del lst[self._load:]
+                self._maxes.insert(i, lst[-1])
+        self._len += 1
+
+    def remove(self, value) -> None:
+        i = bisect_left(self._maxes, value)
+        lst = self._lists[i]
+        j = bisect_left(lst, value)
+        del lst[j]
+        if len(lst) == 0:
+            del self._lists[i]
+            del self._maxes[i]
+        elif j == len(lst):
+            self._maxes[i] = lst[-1]
+        self._len -= 1
+
+    def bisect_left(self, value) -> Tuple[int, int]:
+        i = bisect_left(self._maxes, value)
+        if i == len(self._maxes):
+            return (i, 0)
+        return (i, bisect_left(self._lists[i], value))
+
+    def end(self) -> Tuple[int, int]:
+        return (len(self._lists), 0)
+
+    def before(self, position: Tuple[int, int]):
+        i, j = position
+        if j > 0:
+            return self._lists[i][j-1]
+        if i > 0:
+            return self._lists[i-1][-1]
+        return None
+
+    def count(self, start: Tuple[int, int], end: Tuple[int, int]) -> int:
+        (i0, j0), (i1, j1) = start, end
+        if i0 == i1:
+            return j1 - j0
+        return len(self._lists[i0]) - j0 + sum([len(self._lists[i]) for i in range(i0 + 1, i1)]) + j1
+
+    def items(self, start: Tuple[int, int], end: Tuple[int, int]) -> list:
+        (i0, j0), (i1, j1) = start, end
+        if i0 == len(self._lists):
+            return []
+        if i0 == i1:
+            return self._lists[i0][j0:j1]
+        items = self._lists[i0][j0:]
+        for i in range(i0 + 1, i1):
+            items += self._lists[i]
+        if j1 > 0:
+            items += self._lists[i1][:j1]
+        return items
+
+    def segments(self, start: Tuple[int, int], end: Tuple[int, int]) -> list:
+        """
+        Returns the items from `start` to `end` as `(bucket, first, last)` slices of the buckets, without copying them.
+        """
+        (i0, j0), (i1, j1) = start, end
+        if i0 == len(self._lists):
+            return []
+        if i0 == i1:
+            return [(self._lists[i0], j0, j1)]
+        segments = [(self._lists[i0], j0, len(self._lists[i0]))]
+        segments += [(self._lists[i], 0, len(self._lists[i])) for i in range(i0 + 1, i1)]
+        if j1 > 0:
+            segments.append((self._lists[i1], 0, j1))
+        return segments
+
+    def take(self, start: Tuple[int, int], offsets: Sequence[int]) -> list:
+        """
+        Returns the items at `offsets` (sorted, relative to `start`).
+        """
+        i, j = start
+        base = -j
+        items = []
+        for offset in offsets:
+            while offset - base >= len(self._lists[i]):
+                base += len(self._lists[i])
+                i += 1
+            items.append(self._lists[i][offset - base])
+        return items
+
+    def levels(self) -> Iterator[Tuple[object, Tuple[int, int], Tuple[int, int]]]:
+        """
+        Yields `(key, start, end)` for each distinct first tuple element `key`, by decreasing key.
+        """
+        end = self.end()
+        while True:
+            last = self.before(end)
+            if last is None:
+                return
+            start = self.bisect_left((last[0],))
+            yield (last[0], start, end)
+            end = start
+
+def _shuffled(segments: Sequence[Tuple[list, int, int]], rng=rng) -> Iterator:
+    # Items of `segments` in random order, drawn lazily by a partial Fisher-Yates shuffle of their offsets
+    sizes = [last - first for _, first, last in segments]
+    n = sum(sizes)
+    if n == 1:
+        bucket, first, _ = segments[sizes.index(1)]
+        yield bucket[first]
+        return
+
+    starts = np.cumsum([0] + sizes[:-1]).tolist()
+    order = np.arange(n)
+    i = 0
+    chunk = 16
+    while i < n:
+        # Random numbers are drawn in growing chunks, so that consumers stopping early draw few of them
+        draws = rng.random(min(chunk, n - i))
+        chunk *= 2
+        for u in draws.tolist():
+            j = i + int(u * (n - i))
+            offset = int(order[j])
+            order[j] = order[i]
+            k = bisect_right(starts, offset) - 1
+            bucket, first, _ = segments[k]
+            yield bucket[first + offset - starts[k]]
+            i += 1
+
+class IndexedTxPool(TxPool):
+    """
+    A transaction pool for 1559 transactions (:py:class:`abm1559.txs.Tx1559`), indexed to select the best transactions without sorting the whole pool at each block.
+
+    The tip of a valid 1559 transaction is `min(gas_premium, max_fee - basefee)`. Transactions with `max_fee - gas_premium >= basefee` receive their whole premium and are indexed by `gas_premium`, while the others are capped and indexed by `max_fee`. An index on `max_fee - gas_premium` moves transactions from one side to the other when the basefee changes. Selecting `k` transactions then costs roughly O(k log n), with ties between transactions of equal tips broken at random, as in :py:meth:`abm1559.txpool.TxPool.select_transactions`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.empty_pool()
+
+    def _index(self, tx) -> None:
+        self._seq += 1
+        entry = (self._seq, tx.gas_premium, tx.max_fee)
+        self._entries[tx.tx_hash] = entry
+        slack = tx.max_fee - tx.gas_premium
+        self._by_slack.add((slack, self._seq, tx.tx_hash))
+        if slack >= self._basefee:
+            self._uncapped.add((tx.gas_premium, self._seq, tx.tx_hash))
+        else:
+            self._capped.add((tx.max_fee, self._seq, tx.tx_hash))
+
+    def _unindex(self, tx_hash) -> None:
+        seq, gas_premium, max_fee = self._entries.pop(tx_hash)
+        slack = max_fee - gas_premium
+        self._by_slack.remove((slack, seq, tx_hash))
+        if slack >= self._basefee:
+            self._uncapped.remove((gas_premium, seq, tx_hash))
+        else:
+            self._capped.remove((max_fee, seq, tx_hash))
+
+    def _rebalance(self, basefee) -> None:
+        # Transactions with `max_fee - gas_premium` between the old and new basefee change sides
+        if basefee > self._basefee:
+            start, end = self._by_slack.bisect_left((self._basefee,)), self._by_slack.bisect_left((basefee,))
+            for slack, seq, tx_hash in self._by_slack.items(start, end):
+                _, gas_premium, max_fee = self._entries[tx_hash]
+                self._uncapped.remove((gas_premium, seq, tx_hash))
+                self._capped.add((max_fee, seq, tx_hash))
+        elif basefee < self._basefee:
+            start, end = self._by_slack.bisect_left((basefee,)), self._by_slack.bisect_left((self._basefee,))
+            for slack, seq, tx_hash in self._by_slack.items(start, end):
+                _, gas_premium, max_fee = self._entries[tx_hash]
+                self._capped.remove((max_fee, seq, tx_hash))
+                self._uncapped.add((gas_premium, seq, tx_hash))
+        self._basefee = basefee
+
+    def add_txs(self, txs: Sequence[Transaction], env=None) -> None:
+        for tx in txs:
+            if tx.tx_hash in self.txs:
+                self._unindex(tx.tx_hash)
+            self.txs[tx.tx_hash] = tx
+            self._index(tx)
+
+    def remove_txs(self, tx_hashes: Sequence[str]):
+        for tx_hash in tx_hashes:
+            self._unindex(tx_hash)
+            del(self.txs[tx_hash])
+
+    def empty_pool(self):
+        self.txs = {}
+        self._entries = {}
+        self._by_slack = _SortedList()
+        self._uncapped = _SortedList()
+        self._capped = _SortedList()
+        self._basefee = 0
+        self._seq = 0
+
+    def cancel_txs(self, tx_hashes: Sequence[str], cancel_cost):
+        for tx_hash in tx_hashes:
+            self._unindex(tx_hash)
+            super().cancel_txs([tx_hash], cancel_cost)
+            self._index(self.txs[tx_hash])
+
+    def select_transactions(self, env, user_pool=None, rng=rng, config=None):
+        # Miner side
+        config = constants if config is None else config
+        max_tx_in_block = int(config["MAX_GAS_EIP1559"] / config["SIMPLE_TRANSACTION_GAS"])
+        basefee = env["basefee"]
+        self._rebalance(basefee)
+
+        # Levels of equal tips, on each side of the pool
+        uncapped = self._uncapped.levels()
+        capped = self._capped.levels()
+        next_uncapped = next(uncapped, None)
+        next_capped = next(capped, None)
+
+        selected_txs = []
+        while len(selected_txs) < max_tx_in_block:
+            # Capped transactions with `max_fee < basefee` are invalid
+            if not next_capped is None and next_capped[0] < basefee:
+                next_capped = None
+            if next_uncapped is None and next_capped is None:
+                break
+
+            tip = max([
+                level_tip for level_tip in [
+                    None if next_uncapped is None else next_uncapped[0],
+                    None if next_capped is None else next_capped[0] - basefee,
+                ] if not level_tip is None
+            ])
+
+            ranges = []
+            if not next_uncapped is None and next_uncapped[0] == tip:
+                ranges.append((self._uncapped, next_uncapped[1], next_uncapped[2]))
+                next_uncapped = next(uncapped, None)
+            if not next_capped is None and next_capped[0] - basefee == tip:
+                ranges.append((self._capped, next_capped[1], next_capped[2]))
+                next_capped = next(capped, None)
+
+            sizes = [index.count(start, end) for index, start, end in ranges]
+            remaining = max_tx_in_block - len(selected_txs)
+            if sum(sizes) <= remaining:
+                entries = [entry for index, start, end in ranges for entry in index.items(start, end)]
+            else:
+                # Only part of the tied transactions fit, chosen uniformly at random
+                offsets = sorted(rng.choice(sum(sizes), size=remaining, replace=False))
+                entries = []
+                for (index, start, end), size in zip(ranges, sizes):
+                    entries += index.take(start, [o for o in offsets if o < size])
+                    offsets = [o - size for o in offsets if o >= size]
+            rng.shuffle(entries)
+            selected_txs += [self.txs[tx_hash] for _, _, tx_hash in entries]
+
+        return selected_txs
+
+    def iter_by_tip(self, env, rng=rng) -> Iterator[Tuple[float, Transaction]]:
+        """
+        Valid transactions with their tip, by decreasing tip with ties in random order, read from the index level by level. Tied transactions are drawn lazily, so that consumers stopping once a block is full do not shuffle the whole level.
+        """
+        basefee = env["basefee"]
+        self._rebalance(basefee)
+
+        uncapped = self._uncapped.levels()
+        capped = self._capped.levels()
+        next_uncapped = next(uncapped, None)
+        next_capped = next(capped, None)
+        while True:
+            if not next_capped is None and next_capped[0] < basefee:
+                next_capped = None
+            if next_uncapped is None and next_capped is None:
+                return
+
+            tip = max([
+                level_tip for level_tip in [
+                    None if next_uncapped is None else next_uncapped[0],
+                    None if next_capped is None else next_capped[0] - basefee,
+                ] if not level_tip is None
+            ])
+
+            segments = []
+            if not next_uncapped is None and next_uncapped[0] == tip:
+                segments += self._uncapped.segments(next_uncapped[1], next_uncapped[2])
+                next_uncapped = next(uncapped, None)
+            if not next_capped is None and next_capped[0] - basefee == tip:
+                segments += self._capped.segments(next_capped[1], next_capped[2])
+                next_capped = next(capped, None)
+            for _, _, tx_hash in _shuffled(segments, rng=rng):
+                yield (tip, self.txs[tx_hash])
+
+class GasPackingTxPool(IndexedTxPool):
+    """
+    An :py:class:`abm1559.txpool.IndexedTxPool` filling blocks by the actual gas used of its transactions, up to the block gas limit `MAX_GAS_EIP1559` and skipping transactions above `PER_TX_GASLIMIT` (see :py:func:`abm1559.builder.pack`), rather than taking `MAX_GAS_EIP1559 / SIMPLE_TRANSACTION_GAS` transactions.
+
+    Args:
+        knapsack_window (int): If set, transactions around the greedy boundary are chosen again by knapsack
+    """
+
+    def __init__(self, knapsack_window: int = 0):
+        self.knapsack_window = knapsack_window
+        super().__init__()
+
+    def select_transactions(self, env, user_pool=None, rng=rng, config=None):
+        return pack(self.iter_by_tip(env, rng=rng), knapsack_window=self.knapsack_window, config=config)
+
+def _premium_line(tx) -> Tuple[float, float]:
+    # Premium of `tx` at block `t` as `intercept + rate * t`
+    if not hasattr(tx, "start_premium"):
+        return (tx.gas_premium, 0.0)
+    if tx.max_block == tx.start_block:
+        return (tx.start_premium, 0.0)
+    rate = (tx.max_premium - tx.start_premium) / (tx.max_block - tx.start_block)
+    return (tx.start_premium - rate * tx.start_block, rate)
+
+def _ids_to_array(ids: Sequence) -> np.ndarray:
+    # Identifiers, e.g. `tx_hash` or `sender`, as unsigned integers
+    # Either 8 bytes or integers from :py:class:`abm1559.utils.IdCounter`
+    if len(ids) > 0 and isinstance(ids[0], int):
+        return np.array(ids, dtype=np.uint64)
+    return np.frombuffer(b"".join(ids), dtype=">u8").astype(np.uint64)
+
+def _array_to_ids(values: np.ndarray, int_ids: bool = False) -> Sequence:
+    if int_ids:
+        return values.tolist()
+    return [value.to_bytes(8, "big") for value in values.tolist()]
+
+class ColumnarTxPool(TxPool):
+    """
+    A transaction pool for 1559 transactions stored as growable NumPy arrays, one per field (`max_fee`, `gas_premium`, `start_block`, `gas_used`, `sender` and `tx_hash`).
+
+    Validity, tips and gas prices are computed for the whole pool at once from the arrays, and selection uses `np.argpartition` rather than a full sort. The transactions themselves are kept alongside, and returned as they were added. Identifiers are either all 8 bytes or all integers, as set by the first transactions added; adding transactions with the other type raises `TypeError`. A transaction added again replaces the previous one with the same hash.
+    """
+
+    _columns = {
+        "max_fee": np.float64,
+        "gas_premium": np.float64,
+        "start_block": np.int64,
+        "gas_used": np.int64,
+        "sender": np.uint64,
+        "tx_hash": np.uint64,
+        "tx": object,
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.initial_capacity = capacity
+        self.empty_pool()
+
+    @property
+    def txs(self):
+        # Materializes the whole pool, prefer the vectorized methods
+        rows = np.flatnonzero(self._alive[:self._size])
+        return dict(zip(_array_to_ids(self._data["tx_hash"][rows], self._int_ids["tx_hash"]), self._materialize(rows)))
+
+    def pool_length(self) -> int:
+        return len(self._rows)
+
+    def _grow(self, size: int) -> None:
+        capacity = len(self._alive)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, column in self._data.items():
+            self._data[name] = np.resize(column, capacity)
+        self._alive = np.resize(self._alive, capacity)
+        self._alive[self._size:] = False
+
+    def _compact(self) -> None:
+        rows = np.flatnonzero(self._alive[:self._size])
+        for column in self._data.values():
+            column[:len(rows)] = column[rows]
+        self._alive[:len(rows)] = True
+        self._alive[len(rows):] = False
+        self._size = len(rows)
+        self._rows = dict(zip(self._data["tx_hash"][:self._size].tolist(), range(self._size)))
+        # Removed transactions are released
+        self._data["tx"][self._size:] = None
+
+    def _materialize(self, rows: np.ndarray) -> Sequence[Transaction]:
+        return self._data["tx"][rows].tolist()
+
+    def _prepare_batch(self, txs: Sequence[Transaction]) -> Tuple[Sequence[Transaction], np.ndarray]:
+        # Keeps the last of transactions sharing a hash, replacing those already in the pool
+        unique = { tx.tx_hash: tx for tx in txs }
+        if len(unique) < len(txs):
+            txs = list(unique.values())
+
+        # The type of identifiers is set by the first transactions added
+        for name in ("sender", "tx_hash"):
+            int_ids = isinstance(getattr(txs[0], name), int)
+            if self._int_ids[name] is None:
+                self._int_ids[name] = int_ids
+            elif self._int_ids[name] != int_ids:
+                kinds = { True: "integers", False: "bytes" }
+                raise TypeError(f"Expected {name} as {kinds[self._int_ids[name]]}, got {kinds[int_ids]}")
+
+        tx_hashes = _ids_to_array([tx.tx_hash for tx in txs])
+        for tx_hash in tx_hashes.tolist():
+            if tx_hash in self._rows:
+                self._alive[self._rows.pop(tx_hash)] = False
+        return txs, tx_hashes
+
+    def add_txs(self, txs: Sequence[Transaction], env=None) -> None:
+        if len(txs) == 0:
+            return
+
+        txs, tx_hashes = self._prepare_batch(txs)
+
+        start, end = self._size, self._size + len(txs)
+        self._grow(end)
+        self._data["max_fee"][start:end] = [tx.max_fee for tx in txs]
+        self._data["gas_premium"][start:end] = [tx.gas_premium for tx in txs]
+        self._data["start_block"][start:end] = [tx.start_block for tx in txs]
+        self._data["gas_used"][start:end] = [tx.gas_used for tx in txs]
+        self._data["sender"][start:end] = _ids_to_array([tx.sender for tx in txs])
+        self._data["tx_hash"][start:end] = tx_hashes
+        self._data["tx"][start:end] = txs
+        self._alive[start:end] = True
+        self._size = end
+        self._rows.update(zip(tx_hashes.tolist(), range(start, end)))
+
+    def remove_txs(self, tx_hashes: Sequence[str]):
+        if len(tx_hashes) == 0:
+            return
+
+        for tx_hash in _ids_to_array(tx_hashes).tolist():
+            self._alive[self._rows.pop(tx_hash)] = False
+
+        # Removed rows are reclaimed once they outnumber live ones
+        if self._size - len(self._rows) > max(len(self._rows), self.initial_capacity):
+            self._compact()
+
+    def empty_pool(self):
+        self._data = { name: np.zeros(self.initial_capacity, dtype=dtype) for name, dtype in self._columns.items() }
+        self._alive = np.zeros(self.initial_capacity, dtype=bool)
+        self._size = 0
+        self._rows = {}
+        # Are identifiers integers rather than bytes? Unknown until transactions are added
+        self._int_ids = { "sender": None, "tx_hash": None }
+
+    def cancel_txs(self, tx_hashes: Sequence[str], cancel_cost):
+        rows = [self._rows[tx_hash] for tx_hash in _ids_to_array(tx_hashes).tolist()]
+        self._data["gas_used"][rows] = 0
+        self._data["gas_premium"][rows] += cancel_cost
+        for tx in self._data["tx"][rows]:
+            tx.gas_used = 0
+            tx.gas_premium += cancel_cost
+
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self._alive[:self._size])
+
+    def is_valid(self, rows: np.ndarray, env) -> np.ndarray:
+        return self._data["max_fee"][rows] >= env["basefee"]
+
+    def gas_price(self, rows: np.ndarray, env) -> np.ndarray:
+        basefee = env["basefee"]
+        return np.minimum(self._data["max_fee"][rows], basefee + self._data["gas_premium"][rows])
+
+    def tip(self, rows: np.ndarray, env) -> np.ndarray:
+        return self.gas_price(rows, env) - env["basefee"]
+
+    def average_tip(self, env): # in Gwei
+        rows = self._live_rows()
+        return 0 if len(rows) == 0 else self.tip(rows, env).mean() / (10 ** 9)
+
+    def average_gas_price(self, env):
+        rows = self._live_rows()
+        return 0 if len(rows) == 0 else self.gas_price(rows, env).mean() / (10 ** 9)
+
+    def average_waiting_time(self, current_height):
+        rows = self._live_rows()
+        return 0 if len(rows) == 0 else (current_height - self._data["start_block"][rows]).mean()
+
+    def average_value(self, user_pool):
+        senders = _array_to_ids(self._data["sender"][self._live_rows()], self._int_ids["sender"])
+        return 0.0 if len(senders) == 0 else sum([user_pool.get_user(sender).value for sender in senders]) / len(senders)
+
+    def select_transactions(self, env, user_pool=None, rng=rng, config=None):
+        # Miner side
+        config = constants if config is None else config
+        max_tx_in_block = int(config["MAX_GAS_EIP1559"] / config["SIMPLE_TRANSACTION_GAS"])
+
+        rows = self._live_rows()
+        rows = rows[self.is_valid(rows, env)]
+        tips = self.tip(rows, env)
+
+        if len(rows) > max_tx_in_block:
+            # Transactions tied with the last one to fit in the block are chosen at random
+            threshold = tips[np.argpartition(-tips, max_tx_in_block - 1)[max_tx_in_block - 1]]
+            above = np.flatnonzero(tips > threshold)
+            tied = np.flatnonzero(tips == threshold)
+            keep = np.concatenate([above, rng.choice(tied, size=max_tx_in_block - len(above), replace=False)])
+            rows, tips = rows[keep], tips[keep]
+
+        # Decreasing tips, ties in random order
+        order = np.lexsort((rng.random(len(rows)), -tips))
+        return self._materialize(rows[order])
+
+class EscalatorTxPool(ColumnarTxPool):
+    """
+    A :py:class:`abm1559.txpool.ColumnarTxPool` for escalator transactions (:py:class:`abm1559.txs.TxEscalator`, :py:class:`abm1559.txs.TxFloatingEsc`), whose premium rises linearly from `start_block` to `max_block`, alongside 1559 transactions (:py:class:`abm1559.txs.Tx1559`) whose premium is constant.
+
+    The premium of each transaction is stored as a line `intercept + rate * current_block`, so that the tips of the whole pool at a new block are computed at once from the arrays, without calling the transactions. Transactions past their `max_block` can no longer be included and expire when the pool moves to a later block. The transactions themselves are kept, and returned as they were added. As in the parent pool, a transaction added again replaces the previous one with the same hash, and identifiers keep the type of the first transactions added.
+    """
+
+    _columns = {
+        "intercept": np.float64,
+        "rate": np.float64,
+        "max_fee": np.float64,
+        # 1 for transactions paying the basefee on top of their premium, 0 for plain escalators
+        "basefee_share": np.float64,
+        "start_block": np.int64,
+        "max_block": np.float64,
+        "gas_used": np.int64,
+        "sender": np.uint64,
+        "tx_hash": np.uint64,
+        "tx": object,
+    }
+
+    def __init__(self, capacity: int = 1024):
+        super().__init__(capacity=capacity)
+
+    def add_txs(self, txs: Sequence[Transaction], env=None) -> None:
+        if not env is None and not env.get("current_block") is None:
+            self.expire(env["current_block"])
+        if len(txs) == 0:
+            return
+
+        txs, tx_hashes = self._prepare_batch(txs)
+
+        start, end = self._size, self._size + len(txs)
+        self._grow(end)
+        lines = np.array([_premium_line(tx) for tx in txs], dtype=np.float64).reshape(-1, 2)
+        self._data["intercept"][start:end] = lines[:, 0]
+        self._data["rate"][start:end] = lines[:, 1]
+        self._data["max_fee"][start:end] = [getattr(tx, "max_fee", np.inf) for tx in txs]
+        self._data["basefee_share"][start:end] = [0.0 if isinstance(tx, TxEscalator) else 1.0 for tx in txs]
+        self._data["start_block"][start:end] = [tx.start_block for tx in txs]
+        self._data["max_block"][start:end] = [getattr(tx, "max_block", np.inf) for tx in txs]
+        self._data["gas_used"][start:end] = [tx.gas_used for tx in txs]
+        self._data["sender"][start:end] = _ids_to_array([tx.sender for tx in txs])
+        self._data["tx_hash"][start:end] = tx_hashes
+        self._data["tx"][start:end] = txs
+        self._alive[start:end] = True
+        self._size = end
+        self._rows.update(zip(tx_hashes.tolist(), range(start, end)))
+
+    def expire(self, current_block: int) -> Sequence[Transaction]:
+        """
+        Removes and returns the transactions whose `max_block` is before `current_block`.
+        """
+        rows = self._live_rows()
+        rows = rows[self._data["max_block"][rows] < current_block]
+        expired = self._materialize(rows)
+        self.remove_txs(_array_to_ids(self._data["tx_hash"][rows], self._int_ids["tx_hash"]))
+        return expired
+
+    def cancel_txs(self, tx_hashes: Sequence[str], cancel_cost):
+        rows = [self._rows[tx_hash] for tx_hash in _ids_to_array(tx_hashes).tolist()]
+        self._data["gas_used"][rows] = 0
+        self._data["intercept"][rows] += cancel_cost
+        for tx in self._data["tx"][rows]:
+            tx.gas_used = 0
+            if hasattr(tx, "gas_premium"):
+                tx.gas_premium += cancel_cost
+
+    def premium(self, rows: np.ndarray, env) -> np.ndarray:
+        return self._data["intercept"][rows] + self._data["rate"][rows] * env["current_block"]
+
+    def is_valid(self, rows: np.ndarray, env) -> np.ndarray:
+        current_block = env["current_block"]
+        return (self._data["start_block"][rows] <= current_block) & \
+            (current_block <= self._data["max_block"][rows]) & \
+            (env["basefee"] <= self._data["max_fee"][rows])
+
+    def gas_price(self, rows: np.ndarray, env) -> np.ndarray:
+        basefee = env["basefee"] * self._data["basefee_share"][rows]
+        return np.minimum(self._data["max_fee"][rows], basefee + self.premium(rows, env))
+
+    def tip(self, rows: np.ndarray, env) -> np.ndarray:
+        return self.gas_price(rows, env) - env["basefee"] * self._data["basefee_share"][rows]
+
+    def select_transactions(self, env, user_pool=None, rng=rng, config=None):
+        self.expire(env["current_block"])
+        return super().select_transactions(env, user_pool=user_pool, rng=rng, config=config)
+
+eviction_policies = {
+    "tip": lambda tx, env: tx.tip(env),
+    "max_fee": lambda tx, env: tx.max_fee,
+    "premium": lambda tx, env: tx.gas_premium,
+    "oldest": lambda tx, env: tx.start_block,
+}
+"""
+Eviction policies of :py:class:`abm1559.txpool.BoundedTxPool`, giving the key of a transaction in the environment where it is added. Transactions with the lowest key are evicted first.
+"""
+
+# Policies whose key depends on the environment
+_env_policies = ("tip",)
+
+class BoundedTxPool(TxPool):
+    """
+    A transaction pool holding at most `capacity` transactions. When new transactions take the pool over capacity, those with the lowest key under `policy` are evicted, with earlier transactions evicted first among equal keys. When `max_age` is set, transactions sent `max_age` blocks or more before the current block expire. :py:meth:`add_txs` returns the evicted and expired transactions.
+
+    Keys are kept in a min-heap and transactions in a time wheel bucketed by `start_block`, so that evicting or expiring a transaction costs O(log n) rather than sorting the pool. Transactions removed from the pool are deleted from both lazily.
+
+    Keys are computed once, when the transaction is added. With the `"tip"` policy, the key depends on the basefee at that time; :py:meth:`rekey` recomputes all keys in a new environment in O(n).
+
+    The bound composes with other pools through multiple inheritance, e.g., `class BoundedIndexedTxPool(BoundedTxPool, IndexedTxPool)`.
+
+    Args:
+        capacity (int): Maximum number of transactions in the pool
+        policy (Union[str, Callable]): One of :py:data:`abm1559.txpool.eviction_policies` or a callable `(tx, env)` returning the key of `tx`. With `"tip"`, transactions must be added with an `env`, other policies also accept `env = None`.
+        max_age (int): If given, number of blocks after which transactions expire
+    """
+
+    def __init__(self, capacity: int, policy="tip", max_age: int = None, **kwargs):
+        self.capacity = capacity
+        self.policy = eviction_policies[policy] if isinstance(policy, str) else policy
+        self.needs_env = isinstance(policy, str) and policy in _env_policies
+        self.max_age = max_age
+        super().__init__(**kwargs)
+        self._reset_bounds()
+
+    def _reset_bounds(self) -> None:
+        # Heap of `(key, seq, tx)`, an entry is live if `seq` is the current one of its transaction
+        self._heap = []
+        self._seqs = {}
+        self._next_seq = 0
+        # Time wheel of `(seq, tx)` by `start_block`, all blocks before `_oldest` are empty
+        self._wheel = {}
+        self._oldest = None
+        self._env = None
+
+    def _track(self, tx, env) -> None:
+        self._next_seq += 1
+        seq = self._next_seq
+        self._seqs[tx.tx_hash] = seq
+        heapq.heappush(self._heap, (self.policy(tx, env), seq, tx))
+        if not self.max_age is None:
+            self._wheel.setdefault(tx.start_block, []).append((seq, tx))
+            if self._oldest is None or tx.start_block < self._oldest:
+                self._oldest = tx.start_block
+
+    def _check_env(self, env) -> None:
+        if env is None and self.needs_env:
+            raise ValueError("The eviction policy depends on the environment, transactions must be added with an env")
+
+    def _is_live(self, seq, tx) -> bool:
+        return self._seqs.get(tx.tx_hash) == seq
+
+    def expire(self, current_block: int) -> Sequence[Transaction]:
+        """
+        Removes and returns the transactions sent `max_age` blocks or more before `current_block`.
+        """
+        if self.max_age is None or self._oldest is None:
+            return []
+
+        expired = []
+        cutoff = current_block - self.max_age
+        while self._oldest <= cutoff and len(self._wheel) > 0:
+            for seq, tx in self._wheel.pop(self._oldest, []):
+                if self._is_live(seq, tx):
+                    expired.append(tx)
+            self._oldest += 1
+        if len(self._wheel) == 0:
+            self._oldest = None
+        self.remove_txs([tx.tx_hash for tx in expired])
+        return expired
+
+    def evict(self, n: int) -> Sequence[Transaction]:
+        """
+        Removes and returns the `n` transactions with the lowest keys.
+        """
+        evicted = []
+        while len(evicted) < n and len(self._heap) > 0:
+            key, seq, tx = heapq.heappop(self._heap)
+            if self._is_live(seq, tx):
+                # Evicted transactions leave the heap now, and `_seqs` with `remove_txs`
+                evicted.append(tx)
+        self.remove_txs([tx.tx_hash for tx in evicted])
+        return evicted
+
+    def rekey(self, env) -> None:
+        """
+        Recomputes the key of every transaction in environment `env`.
+        """
+        live = [(seq, tx) for key, seq, tx in self._heap if self._is_live(seq, tx)]
+        self._heap = [(self.policy(tx, env), seq, tx) for seq, tx in live]
+        heapq.heapify(self._heap)
+
+    def add_txs(self, txs: Sequence[Transaction], env=None) -> Sequence[Transaction]:
+        """
+        Adds `txs` to the pool, then expires transactions older than `max_age` and evicts the lowest transactions over capacity.
+
+        Returns:
+            Sequence[Transaction]: The expired and evicted transactions
+        """
+
+        self._check_env(env)
+        super().add_txs(txs, env)
+        self._env = env
+        for tx in txs:
+            self._track(tx, env)
+
+        evicted = []
+        if not env is None and not env.get("current_block") is None:
+            evicted += self.expire(env["current_block"])
+        evicted += self.evict(self.pool_length() - self.capacity)
+        return evicted
+
+    def remove_txs(self, tx_hashes: Sequence[str]):
+        super().remove_txs(tx_hashes)
+        for tx_hash in tx_hashes:
+            del self._seqs[tx_hash]
+
+        # Entries of removed transactions are dropped once they outnumber live ones
+        if len(self._heap) > 2 * len(self._seqs) + 1024:
+            self._heap = [entry for entry in self._heap if self._is_live(entry[1], entry[2])]
+            heapq.heapify(self._heap)
+            for start_block in list(self._wheel):
+                bucket = [(seq, tx) for seq, tx in self._wheel[start_block] if self._is_live(seq, tx)]
+                if len(bucket) == 0:
+                    del self._wheel[start_block]
+                else:
+                    self._wheel[start_block] = bucket
+
+    def empty_pool(self):
+        super().empty_pool()
+        self._reset_bounds()
+
+    def cancel_txs(self, tx_hashes: Sequence[str], cancel_cost):
+        # Cancelled transactions are keyed again in the environment of the last addition
+        self._check_env(self._env)
+        super().cancel_txs(tx_hashes, cancel_cost)
+        for tx_hash in tx_hashes:
+            self._track(self.txs[tx_hash], self._env)
@@ -1,7 +1,8 @@
-from abm1559.config import rng
+from abm1559.config import rng, ids
 
 from abm1559.utils import (
     constants,
+    hex_id,
 )
 
 class Transaction:
@@ -9,6 +10,8 @@ class Transaction:
     An abstract superclass for transactions.
     """
 
+    __slots__ = ("sender", "start_block", "gas_used", "tx_hash")
+
     def __init__(self, sender, tx_params, gas_used=constants["SIMPLE_TRANSACTION_GAS"], tx_hash=None, rng=rng):
         self.sender = sender
         self.start_block = tx_params["start_block"]
@@ -23,9 +26,9 @@ class Transaction:
         return {
             "tx": self,
             "start_block": self.start_block,
-            "sender": self.sender.hex(),
+            "sender": hex_id(self.sender),
             "gas_used": self.gas_used,
-            "tx_hash": self.tx_hash.hex(),
+            "tx_hash": hex_id(self.tx_hash),
         }
 
 class Tx1559(Transaction):
@@ -33,6 +36,8 @@ class Tx1559(Transaction):
     Inherits from :py:class:`abm1559.txs.Transaction`. A 1559-type transaction.
     """
 
+    __slots__ = ("gas_premium", "max_fee")
+
     def __init__(self, sender, tx_params, **kwargs):
         super().__init__(sender, tx_params, **kwargs)
 
@@ -40,7 +45,7 @@ class Tx1559(Transaction):
         self.max_fee = tx_params["max_fee"]
 
     def __str__(self):
-        return f"1559 Transaction {self.tx_hash.hex()}: max_fee {self.max_fee}, gas_premium {self.gas_premium}, gas_used {self.gas_used}"
+        return f"1559 Transaction {hex_id(self.tx_hash)}: max_fee {self.max_fee}, gas_premium {self.gas_premium}, gas_used {self.gas_used}"
 
     def is_valid(self, env):
         basefee = env["basefee"]
@@ -69,6 +74,8 @@ class TxEscalator(Transaction):
     Inherits from :py:class:`abm1559.txs.Transaction`. An escalator-type transaction.
     """
 
+    __slots__ = ("max_block", "start_premium", "max_premium")
+
     def __init__(self, sender, tx_params, **kwargs):
         super().__init__(sender, tx_params, **kwargs)
 
@@ -77,7 +84,7 @@ class TxEscalator(Transaction):
         self.max_premium = tx_params["max_premium"]
 
     def __str__(self):
-        return f"Escalator Transaction {self.tx_hash.hex()}: start block {self.start_block}, " + \
+        return f"Escalator Transaction {hex_id(self.tx_hash)}: start block {self.start_block}, " + \
                 f"max block {self.max_block}, start premium {self.start_premium}, max premium {self.max_premium}"
 
     def is_valid(self, env):
@@ -100,6 +107,8 @@ class TxFloatingEsc(Transaction):
     Inherits from :py:class:`abm1559.txs.Transaction`. A floating escalator-type transaction.
     """
 
+    __slots__ = ("max_block", "start_premium", "max_premium", "max_fee")
+
     def __init__(self, sender, tx_params, **kwargs):
         super().__init__(sender, tx_params, **kwargs)
 
@@ -117,7 +126,7 @@ class TxFloatingEsc(Transaction):
             self.max_premium = tx_params["max_premium"]
 
     def __str__(self):
-        return f"Floating Escalator Transaction {self.tx_hash.hex()}: start block {self.start_block}, " + \
+        return f"Floating Escalator Transaction {hex_id(self.tx_hash)}: start block {self.start_block}, " + \
                 f"max block {self.max_block}, start premium {self.start_premium}, max premium {self.max_premium}, " + \
                 f"max fee {self.max_fee}"
 
@@ -155,6 +164,9 @@ class TxLegacy(Transaction):
     """
     Inherits from :py:class:`abm1559.txs.Transaction`. A legacy-type transaction.
     """
+
+    __slots__ = ("_gas_price",)
+
     def __init__(self, sender, tx_params, **kwargs):
         super().__init__(sender, tx_params, **kwargs)
 
@@ -169,10 +181,32 @@ class TxLegacy(Transaction):
         return self.gas_price(env)
 
     def __str__(self):
-        return f"Legacy Transaction {self.tx_hash.hex()}: gas_price {self.gas_price}"
+        return f"Legacy Transaction {hex_id(self.tx_hash)}: gas_price {self.gas_price}"
 
     def tx_data(self, env):
         return {
             **super().tx_data(env),
             "gas_price": self.gas_price / (10 ** 9),
         }
+
+class CompactTransaction:
+    """
+    Mixin for transactions identified by an integer `tx_hash` assigned by `ids` (see :py:class:`abm1559.utils.IdCounter`), rather than 8 random bytes.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, sender, tx_params, tx_hash=None, ids=ids, **kwargs):
+        super().__init__(sender, tx_params, tx_hash=ids() if tx_hash is None else tx_hash, **kwargs)
+
+class CompactTx1559(CompactTransaction, Tx1559):
+    __slots__ = ()
+
+class CompactTxEscalator(CompactTransaction, TxEscalator):
+    __slots__ = ()
+
+class CompactTxFloatingEsc(CompactTransaction, TxFloatingEsc):
+    __slots__ = ()
+
+class CompactTxLegacy(CompactTransaction, TxLegacy):
+    __slots__ = ()
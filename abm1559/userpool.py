@@ -1,4 +1,5 @@
 from typing import Sequence, Dict
+from collections import defaultdict
 
 import pandas as pd
 
@@ -6,23 +7,69 @@ from abm1559.txs import Transaction
 from abm1559.users import User
 
 class UserPool:
+    """
+    Holds users and queries them for transactions.
 
-    def __init__(self):
+    Args:
+        writer (UserWriter): If given, new users are written out as they are added (see :py:class:`abm1559.export.UserWriter`)
+        keep_retired (bool): Should retired users be kept in `users`? With a `writer`, unsetting it bounds memory to the live users.
+    """
+
+    def __init__(self, writer=None, keep_retired: bool = True):
+        self.writer = writer
+        self.keep_retired = keep_retired
         self.users = {}
-        
+        # Live users indexed by wakeup block
+        self.users_by_wakeup = defaultdict(dict)
+        # Users who may still transact, queried when `query_all` is set
+        self.live_users = {}
+        # Users whose last transaction is still pending, with its hash
+        self.pending_users = {}
+
     def add_users(self, users: Sequence[User]) -> None:
         for user in users:
-            self.users[user.pub_key] = user
-    
+            self.add_user(user)
+
+    def add_user(self, user: User) -> None:
+        if not user.pub_key in self.users and not self.writer is None:
+            self.writer.write_users([user])
+        self.users[user.pub_key] = user
+        self.live_users[user.pub_key] = user
+        self.users_by_wakeup[user.wakeup_block][user.pub_key] = user
+
+    def retire_users(self, pub_keys: Sequence) -> None:
+        """
+        Users who will not transact again, e.g., whose transaction was included, are no longer queried. They remain in `users` unless `keep_retired` is unset.
+        """
+        for pub_key in pub_keys:
+            user = self.live_users.pop(pub_key, None)
+            if user is None:
+                continue
+            self.pending_users.pop(pub_key, None)
+            bucket = self.users_by_wakeup[user.wakeup_block]
+            del bucket[pub_key]
+            if len(bucket) == 0:
+                del self.users_by_wakeup[user.wakeup_block]
+            if not self.keep_retired:
+                del self.users[pub_key]
+
+    def transact(self, user: User, env: Dict) -> Transaction:
+        tx = user.transact(env)
+        if tx is None:
+            self.pending_users.pop(user.pub_key, None)
+        else:
+            self.pending_users[user.pub_key] = tx.tx_hash
+        return tx
+
     def query_users(self, env: Dict, query_all: bool = False) -> Sequence[Transaction]:
         if query_all:
-            users_to_query = self.users.values()
+            users_to_query = list(self.live_users.values())
         else:
-            users_to_query = [user for user in self.users.values() if user.wakeup_block == env["current_block"]]
+            users_to_query = list(self.users_by_wakeup.get(env["current_block"], {}).values())
         
         txs = []  
         for user in users_to_query:
-            tx = user.transact(env)
+            tx = self.transact(user, env)
             if not tx is None:
                 txs.append(tx)
         return txs
@@ -35,7 +82,7 @@ class UserPool:
         Args:
             users (Sequence[User]): Sequence of new users
             env (Dict): Current simulation environment parameters (e.g., basefee)
-            query_all (bool): Should all users in the pool be queried, or new incoming users only?
+            query_all (bool): Should all live users in the pool be queried, or new incoming users only?
 
         Returns:
             Sequence[Transaction]: An array of transactions
@@ -44,17 +91,13 @@ class UserPool:
         txs = []
         if not query_all:
             for user in users:
-                self.users[user.pub_key] = user
-                tx = user.transact(env)
+                self.add_user(user)
+                tx = self.transact(user, env)
                 if not tx is None:
                     txs.append(tx)
         else:
-            for user in users:
-                self.users[user.pub_key] = user
-            for pub_key, user in self.users.items():
-                tx = user.transact(env)
-                if not tx is None:
-                    txs.append(tx)
+            self.add_users(users)
+            txs = self.query_users(env, query_all=True)
 
         return txs
 
@@ -1,16 +1,20 @@
-from typing import Dict
+from typing import Dict, Sequence
 
+import numpy as np
 import pandas as pd
 
-from abm1559.config import rng
+from abm1559.config import rng, ids
 
 from abm1559.utils import (
     get_basefee_bounds,
+    hex_id,
 )
 
 from abm1559.txs import (
     Tx1559,
-    TxFloatingEsc
+    TxFloatingEsc,
+    CompactTx1559,
+    CompactTxFloatingEsc,
 )
 
 class User:
@@ -29,12 +33,16 @@ class User:
     - (Requested) `transact(env)`: Queried by the simulation when user is spawned. Returns either a transaction or `None` if they balk.
     """
 
-    def __init__(self, wakeup_block, pub_key=None, value=None, rng=rng, **kwargs):
+    __slots__ = ("wakeup_block", "rng", "id_rng", "pub_key", "value", "tx_hash")
+
+    def __init__(self, wakeup_block, pub_key=None, value=None, rng=rng, id_rng=None, **kwargs):
         self.wakeup_block = wakeup_block
         self.rng = rng
+        # Draws public keys and transaction hashes, defaults to `rng`
+        self.id_rng = rng if id_rng is None else id_rng
 
         if pub_key is None:
-            self.pub_key = rng.bytes(8)
+            self.pub_key = self.id_rng.bytes(8)
         else:
             self.pub_key = pub_key
 
@@ -74,7 +82,7 @@ class User:
     def export(self):
         return {
             "user": self,
-            "pub_key": self.pub_key.hex(),
+            "pub_key": hex_id(self.pub_key),
             "value": self.value / (10 ** 9), # in Gwei
             "wakeup_block": self.wakeup_block,
         }
@@ -84,6 +92,10 @@ class AffineUser(User):
     Affine users incur a fixed cost per unit of time.
     """
 
+    __slots__ = ("cost_per_unit",)
+    # Label of the user class in exports
+    user_type = "affine_user"
+
     def __init__(self, wakeup_block, **kwargs):
         super().__init__(wakeup_block, **kwargs)
 
@@ -104,7 +116,7 @@ class AffineUser(User):
     def export(self):
         return {
             **super().export(),
-            "user_type": "affine_user",
+            "user_type": self.user_type,
             "cost_per_unit": self.cost_per_unit / (10 ** 9), # in Gwei
         }
 
@@ -113,11 +125,16 @@ class DiscountUser(User):
     The value of discount users is reduced over time.
     """
 
+    __slots__ = ("discount_rate",)
+    user_type = "discount_user"
+    # Discount rate of users not given one, e.g., spawned in a :py:class:`abm1559.users.UserBatch`
+    default_discount_rate = 0.01
+
     def __init__(self, wakeup_block, **kwargs):
         super().__init__(wakeup_block, **kwargs)
 
         if not "discount_rate" in kwargs:
-            self.discount_rate = 0.01
+            self.discount_rate = self.default_discount_rate
         else:
             self.discount_rate = kwargs["discount_rate"]
 
@@ -132,7 +149,7 @@ class DiscountUser(User):
     def export(self):
         return {
             **super().export(),
-            "user_type": "discount_user",
+            "user_type": self.user_type,
             "discount_rate": self.discount_rate,
         }
 
@@ -140,6 +157,10 @@ class User1559(AffineUser):
     """
     An affine user sending 1559 transactions.
     """
+
+    __slots__ = ()
+    TxClass = Tx1559
+    user_type = "user_1559"
     # Expects to be included within 5 blocks
     # Prefers not to participate if its expected payoff is negative
     # Fixed gas_premium
@@ -159,9 +180,10 @@ class User1559(AffineUser):
     def create_transaction(self, env):
         tx_params = self.decide_parameters(env)
 
-        tx = Tx1559(
+        tx = self.TxClass(
             sender = self.pub_key,
             tx_params = tx_params,
+            rng = self.id_rng,
         )
 
         expected_block = self.wakeup_block + self.expected_time(env)
@@ -182,7 +204,7 @@ class User1559(AffineUser):
     def export(self):
         return {
             **super().export(),
-            "user_type": "user_1559",
+            "user_type": self.user_type,
         }
 
     def __str__(self):
@@ -192,6 +214,10 @@ class UserFloatingEsc(AffineUser):
     """
     An affine user sending floating escalator transactions.
     """
+
+    __slots__ = ()
+    TxClass = TxFloatingEsc
+    user_type = "user_floatingesc"
     # Expects to be included in the next block
     # Prefers not to participate if its expected payoff is negative
 
@@ -201,10 +227,10 @@ class UserFloatingEsc(AffineUser):
     def create_transaction(self, env):
         tx_params = self.decide_parameters(env)
 
-        tx = TxFloatingEsc(
+        tx = self.TxClass(
             sender = self.pub_key,
             tx_params = tx_params,
-            rng = self.rng,
+            rng = self.id_rng,
         )
 
         expected_block = self.wakeup_block + self.expected_time(env)
@@ -228,8 +254,121 @@ class UserFloatingEsc(AffineUser):
     def export(self):
         return {
             **super().export(),
-            "user_type": "user_floatingesc",
+            "user_type": self.user_type,
         }
 
     def __str__(self):
         return f"Floating escalator affine user with value {self.value} and cost {self.cost_per_unit}"
+
+class CompactUser:
+    """
+    Mixin for users identified by an integer `pub_key` assigned by `ids` (see :py:class:`abm1559.utils.IdCounter`), rather than 8 random bytes.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, wakeup_block, pub_key=None, ids=ids, **kwargs):
+        super().__init__(wakeup_block, pub_key=ids() if pub_key is None else pub_key, **kwargs)
+
+class CompactUser1559(CompactUser, User1559):
+    """
+    A :py:class:`abm1559.users.User1559` sending :py:class:`abm1559.txs.CompactTx1559` transactions.
+    """
+
+    __slots__ = ()
+    TxClass = CompactTx1559
+
+class CompactUserFloatingEsc(CompactUser, UserFloatingEsc):
+    """
+    A :py:class:`abm1559.users.UserFloatingEsc` sending :py:class:`abm1559.txs.CompactTxFloatingEsc` transactions.
+    """
+
+    __slots__ = ()
+    TxClass = CompactTxFloatingEsc
+
+class UserBatch:
+    """
+    A cohort of users waking up at the same block, with values, costs and public keys stored as arrays. Users are created as instances of their class only when accessed, so that spawning draws all randomness in a handful of vectorized calls.
+
+    Values and costs follow the same distributions as :py:class:`abm1559.users.User` and :py:class:`abm1559.users.AffineUser`. Costs are only used for subclasses of :py:class:`abm1559.users.AffineUser`.
+    """
+
+    def __init__(self, wakeup_block, user_classes: Sequence[type], class_index: np.ndarray, pub_keys: bytes, values: np.ndarray, costs: np.ndarray, rng=rng, id_rng=None):
+        self.wakeup_block = wakeup_block
+        self.user_classes = user_classes
+        self.class_index = class_index
+        self.pub_keys = pub_keys
+        self.values = values
+        self.costs = costs
+        self.rng = rng
+        self.id_rng = rng if id_rng is None else id_rng
+        self._users = [None] * len(class_index)
+
+    @classmethod
+    def spawn(cls, wakeup_block, sizes: Dict[type, int], rng=rng, id_rng=None):
+        """
+        Args:
+            wakeup_block (int): Current round
+            sizes (Dict[type, int]): Number of users to spawn for each user class
+            rng (np.random.Generator): Draws values and costs
+            id_rng (np.random.Generator): Draws public keys and transaction hashes, defaults to `rng`
+
+        Returns:
+            UserBatch: The new users
+        """
+        user_classes = list(sizes.keys())
+        class_index = np.repeat(np.arange(len(user_classes)), list(sizes.values()))
+        n = len(class_index)
+        id_rng = rng if id_rng is None else id_rng
+        pub_keys = id_rng.bytes(8 * n)
+        values = (rng.uniform(low = 0, high = 20, size = n) * (10 ** 9)).astype(np.int64)
+        costs = (rng.uniform(low = 0, high = 1, size = n) * (10 ** 9)).astype(np.int64)
+        return cls(wakeup_block, user_classes, class_index, pub_keys, values, costs, rng=rng, id_rng=id_rng)
+
+    def __len__(self) -> int:
+        return len(self.class_index)
+
+    def __getitem__(self, i: int) -> User:
+        if self._users[i] is None:
+            UserClass = self.user_classes[self.class_index[i]]
+            kwargs = {}
+            if issubclass(UserClass, AffineUser):
+                kwargs["cost_per_unit"] = int(self.costs[i])
+            self._users[i] = UserClass(
+                self.wakeup_block,
+                pub_key = self.pub_keys[8 * i:8 * (i+1)],
+                value = int(self.values[i]),
+                rng = self.rng,
+                id_rng = self.id_rng,
+                **kwargs,
+            )
+        return self._users[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def materialize(self) -> Sequence[User]:
+        return list(self)
+
+    def export(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: The users of the batch, with the columns of :py:meth:`abm1559.users.User.export` (`user_type` being the label of the class, e.g., `user_1559`)
+        """
+        affine = np.array([issubclass(UserClass, AffineUser) for UserClass in self.user_classes], dtype=bool)[self.class_index]
+        discount = [issubclass(UserClass, DiscountUser) for UserClass in self.user_classes]
+        columns = {
+            "pub_key": [self.pub_keys[8 * i:8 * (i+1)].hex() for i in range(len(self))],
+            "value": self.values / (10 ** 9), # in Gwei
+            "wakeup_block": self.wakeup_block,
+            "user_type": [getattr(self.user_classes[i], "user_type", None) for i in self.class_index],
+            "cost_per_unit": np.where(affine, self.costs / (10 ** 9), np.nan), # in Gwei
+        }
+        if any(discount):
+            rates = np.array([
+                UserClass.default_discount_rate if is_discount else np.nan
+                for UserClass, is_discount in zip(self.user_classes, discount)
+            ])
+            columns["discount_rate"] = rates[self.class_index]
+        return pd.DataFrame(columns)
@@ -1,3 +1,7 @@
+import inspect
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet
+
 import numpy as np
 
 constants = {
@@ -11,40 +15,71 @@ constants = {
     "SIMPLE_TRANSACTION_GAS": 21000,
 }
 
-def get_basefee_bounds(basefee, blocks):
+@lru_cache(maxsize=None)
+def _keyword_names(fn: Callable) -> FrozenSet[str]:
+    # `None` when `fn` takes `**kwargs`
+    try:
+        parameters = inspect.signature(fn).parameters.values()
+    except (TypeError, ValueError):
+        return frozenset()
+    if any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters):
+        return None
+    return frozenset(
+        parameter.name for parameter in parameters
+        if parameter.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+    )
+
+def accepted_kwargs(fn: Callable, **kwargs) -> Dict:
+    """
+    The keyword arguments in `kwargs` which `fn` accepts, so that hooks written before an argument was added (e.g., `config`) keep working.
+    """
+    # Bound methods are keyed by their function, so that caching does not keep their instance alive
+    key = getattr(fn, "__func__", fn)
+    try:
+        names = _keyword_names(key)
+    except TypeError:
+        # Unhashable callable
+        names = _keyword_names.__wrapped__(key)
+    if names is None:
+        return kwargs
+    return { name: value for name, value in kwargs.items() if name in names }
+
+def get_basefee_bounds(basefee, blocks, config=None):
     # We want to know how high/low the basefee can be after `blocks` steps, starting from `basefee`
-    lb = basefee * ((1 - 1.0 / constants["BASEFEE_MAX_CHANGE_DENOMINATOR"]) ** blocks)
-    ub = basefee * ((1 + 1.0 / constants["BASEFEE_MAX_CHANGE_DENOMINATOR"]) ** blocks)
+    config = constants if config is None else config
+    lb = basefee * ((1 - 1.0 / config["BASEFEE_MAX_CHANGE_DENOMINATOR"]) ** blocks)
+    ub = basefee * ((1 + 1.0 / config["BASEFEE_MAX_CHANGE_DENOMINATOR"]) ** blocks)
     return { "lb": lb, "ub": ub }
 
+def hex_id(identifier) -> str:
+    """
+    Hexadecimal view of an identifier (e.g., `tx_hash` or `pub_key`), either 8 bytes or an integer assigned by :py:class:`abm1559.utils.IdCounter`.
+    """
+    if isinstance(identifier, int):
+        return format(identifier, "016x")
+    return identifier.hex()
+
+class IdCounter:
+    """
+    Assigns increasing integer identifiers, starting after `value`. Integers are cheaper to create and store than the 8 random bytes used by default.
+    """
+
+    def __init__(self, value: int = 0):
+        self.value = value
+
+    def __call__(self) -> int:
+        self.value += 1
+        return self.value
+
 flatten = lambda l: [item for sublist in l for item in sublist]
 
-def basefee_from_csv_history(initial_basefee, csv_path):
-    import pandas as pd
-    from collections import defaultdict
+def basefee_from_csv_history(initial_basefee, csv_path, chunksize=100000):
+    # Streams the CSV, see `abm1559.replay`
+    from abm1559.replay import iter_historical_blocks
     from abm1559.simulator import update_basefee
 
-    df = pd.read_csv(csv_path, sep=",")
-    txs = df.to_dict('records')
-    blocks_list = defaultdict(list)
-    class Tx():
-        def __init__(self, gas_used, gas_price):
-            self.gas_used = gas_used
-            self.gas_price = gas_price
-    class Block(dict):
-        def __init__(self, txs):
-            self.txs = txs
-
-    for tx in txs:
-        # gwei to wei
-        gas_price = tx["gas_price"] * (10 ** 9)
-        new_tx = Tx(tx["gas_used"], gas_price)
-        blocks_list[tx["block_number"]].append(new_tx)
-
     base_fee = initial_basefee
-    for block_num, curr_list in blocks_list.items():
-        curr_block = Block(curr_list)
-        filtered = [tx for tx in curr_block.txs if tx.gas_price > base_fee]
-        base_fee = update_basefee(Block(filtered), base_fee)
+    for block in iter_historical_blocks(csv_path, chunksize=chunksize):
+        base_fee = update_basefee(block.above(base_fee), base_fee)
 
     return base_fee
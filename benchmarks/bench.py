@@ -0,0 +1,194 @@
+"""
+Benchmarks of the hot paths of abm1559, written to a JSON file so that versions can be compared.
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --sizes 1000 10000 --compare results.json
+
+Each benchmark is set up from a fixed seed, then timed `--repeats` times; the minimum, median and mean times (in seconds) are reported.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from statistics import median
+
+import numpy as np
+import pandas as pd
+
+from abm1559 import config
+from abm1559.utils import constants
+from abm1559.txs import Tx1559
+from abm1559.users import User1559
+from abm1559.txpool import TxPool, IndexedTxPool, ColumnarTxPool
+from abm1559.userpool import UserPool
+from abm1559.chain import Block1559, Chain
+from abm1559.simulator import Simulation, spawn_poisson_heterogeneous_demand, update_basefee
+
+SEED = 1559
+SIZES = [1000, 10000, 100000, 1000000]
+POOLS = { "TxPool": TxPool, "IndexedTxPool": IndexedTxPool, "ColumnarTxPool": ColumnarTxPool }
+ENV = { "basefee": 20 * (10 ** 9), "current_block": 10 }
+
+def make_txs(n, rng):
+    config.ids.value = 0
+    premiums = rng.uniform(1, 10, n) * (10 ** 9)
+    max_fees = rng.uniform(10, 40, n) * (10 ** 9)
+    start_blocks = rng.integers(0, 10, n)
+    return [
+        Tx1559(
+            sender = config.ids(),
+            tx_params = { "start_block": int(start_block), "gas_premium": premium, "max_fee": max_fee },
+            tx_hash = config.ids(),
+        ) for premium, max_fee, start_block in zip(premiums.tolist(), max_fees.tolist(), start_blocks.tolist())
+    ]
+
+def make_pool(PoolClass, n):
+    txpool = PoolClass()
+    txpool.add_txs(make_txs(n, np.random.default_rng(SEED)), ENV)
+    return txpool
+
+def timed(fn, setup, repeats):
+    times = []
+    for _ in range(repeats):
+        args = setup()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+def bench_select_transactions(n, repeats):
+    for name, PoolClass in POOLS.items():
+        txpool = make_pool(PoolClass, n)
+        yield name, timed(
+            lambda rng: txpool.select_transactions(ENV, rng=rng),
+            lambda: (np.random.default_rng(SEED),), repeats,
+        )
+
+def bench_average_tip(n, repeats):
+    for name, PoolClass in POOLS.items():
+        txpool = make_pool(PoolClass, n)
+        yield name, timed(lambda: txpool.average_tip(ENV), lambda: (), repeats)
+
+def bench_decide_transactions(n, repeats):
+    def setup():
+        rng = np.random.default_rng(SEED)
+        users = [User1559(ENV["current_block"], rng=rng) for _ in range(n)]
+        return UserPool(), users
+    yield "UserPool", timed(lambda user_pool, users: user_pool.decide_transactions(users, ENV), setup, repeats)
+
+def bench_spawn(n, repeats):
+    yield "spawn_poisson_heterogeneous_demand", timed(
+        lambda rng: spawn_poisson_heterogeneous_demand(ENV["current_block"], n, { User1559: 1 }, rng=rng),
+        lambda: (np.random.default_rng(SEED),), repeats,
+    )
+
+def bench_chain_export(n, repeats):
+    rng = np.random.default_rng(SEED)
+    txs = make_txs(n, rng)
+    chain = Chain()
+    per_block = 1000
+    for height, start in enumerate(range(0, n, per_block)):
+        chain.add_block(Block1559(
+            txs = txs[start:start + per_block], parent_hash = chain.current_head,
+            height = height, basefee = ENV["basefee"], rng = rng,
+        ))
+    yield "Chain", timed(chain.export, lambda: (), repeats)
+
+def bench_update_basefee(n, repeats):
+    class GasBlock:
+        def __init__(self, gas_used):
+            self._gas_used = gas_used
+        def gas_used(self):
+            return self._gas_used
+
+    rng = np.random.default_rng(SEED)
+    blocks = [GasBlock(int(gas)) for gas in rng.integers(0, constants["MAX_GAS_EIP1559"], n)]
+    def run():
+        basefee = constants["INITIAL_BASEFEE"]
+        for block in blocks:
+            basefee = update_basefee(block, basefee)
+    yield "update_basefee", timed(run, lambda: (), repeats)
+
+def bench_end_to_end(blocks, demand, repeats):
+    for name, PoolClass in POOLS.items():
+        def setup():
+            config.ids.value = 0
+            return Simulation([demand] * blocks, { User1559: 1 }, txpool=PoolClass(), rng=np.random.default_rng(SEED)),
+        times = timed(lambda simulation: list(simulation.run()), setup, repeats)
+        yield name, times
+
+BENCHMARKS = {
+    "select_transactions": bench_select_transactions,
+    "average_tip": bench_average_tip,
+    "decide_transactions": bench_decide_transactions,
+    "spawn": bench_spawn,
+    "chain_export": bench_chain_export,
+    "update_basefee": bench_update_basefee,
+}
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(benchmark, variant, size, times):
+    return {
+        "benchmark": benchmark, "variant": variant, "size": size, "repeats": len(times),
+        "min": min(times), "median": median(times), "mean": sum(times) / len(times),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS) + ["end_to_end"], default=list(BENCHMARKS) + ["end_to_end"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--blocks", type=int, default=100, help="Blocks of the end-to-end scenario")
+    parser.add_argument("--demand", type=int, default=2500, help="Users per block of the end-to-end scenario")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Previous results file, prints the ratio of median times")
+    args = parser.parse_args(argv)
+
+    results = []
+    for benchmark in args.benchmarks:
+        if benchmark == "end_to_end":
+            for variant, times in bench_end_to_end(args.blocks, args.demand, args.repeats):
+                row = summarize(benchmark, variant, args.blocks, times)
+                row["blocks_per_second"] = args.blocks / row["median"]
+                results.append(row)
+                print(f"{benchmark:20} {variant:36} {args.blocks:>8} blocks {row['blocks_per_second']:10.2f} blocks/s", flush=True)
+            continue
+        for size in args.sizes:
+            for variant, times in BENCHMARKS[benchmark](size, args.repeats):
+                results.append(summarize(benchmark, variant, size, times))
+                print(f"{benchmark:20} {variant:36} {size:>8} {median(times):12.6f} s", flush=True)
+
+    output = {
+        "meta": {
+            "revision": git_revision(),
+            "python": sys.version,
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": SEED,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    if not args.compare is None:
+        with open(args.compare) as f:
+            previous = { (row["benchmark"], row["variant"], row["size"]): row for row in json.load(f)["results"] }
+        print("\nRatio of median times to", args.compare)
+        for row in results:
+            key = (row["benchmark"], row["variant"], row["size"])
+            if key in previous:
+                print(f"{key[0]:20} {key[1]:36} {key[2]:>8} {row['median'] / previous[key]['median']:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from abm1559.utils import constants
+from abm1559.basefee import update_basefee_paths, simulate_basefee_paths
+from abm1559.simulator import update_basefee
+
+class FixedGasBlock:
+
+    def __init__(self, gas_used):
+        self._gas_used = gas_used
+
+    def gas_used(self):
+        return self._gas_used
+
+def test_update_basefee_paths_matches_update_basefee():
+    rng = np.random.default_rng(0)
+    # Basefees from a few wei up to where the product with the gas delta overflows int64
+    basefees = np.concatenate([np.arange(1, 20), rng.integers(1, 10 ** 18, size=2000, dtype=np.int64)])
+    gas_used = rng.integers(0, constants["MAX_GAS_EIP1559"] + 1, size=len(basefees))
+    gas_used[:3] = [0, constants["TARGET_GAS_USED"], constants["MAX_GAS_EIP1559"]]
+
+    expected = [update_basefee(FixedGasBlock(int(gas)), int(basefee)) for basefee, gas in zip(basefees, gas_used)]
+    assert update_basefee_paths(basefees, gas_used).tolist() == expected
+
+def test_simulate_basefee_paths_matches_update_basefee():
+    gas_used = np.random.default_rng(1).integers(0, constants["MAX_GAS_EIP1559"] + 1, size=(3, 50))
+    basefees, _ = simulate_basefee_paths(gas_used, gas_used_fn=None)
+
+    for path in range(3):
+        basefee = constants["INITIAL_BASEFEE"]
+        expected = [basefee]
+        for gas in gas_used[path]:
+            basefee = update_basefee(FixedGasBlock(int(gas)), basefee)
+            expected.append(basefee)
+        assert basefees[path].tolist() == expected
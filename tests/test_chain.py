@@ -0,0 +1,19 @@
+from abm1559.chain import Chain, Block1559
+
+def make_chain(blocks):
+    chain = Chain()
+    for height in range(blocks):
+        chain.add_block(Block1559([], chain.current_head, height, basefee=10 ** 9))
+    return chain
+
+def test_consumers_track_modified_totals_separately():
+    chain = make_chain(6)
+    chain.modified_from["checkpoint"] = 7
+    chain.add_to_metric("blob_gas_used", 4, 100)
+    chain.modified_from["sharding"] = 7
+    chain.add_to_metric("blob_gas_used", 2, 50)
+
+    assert chain.modified_from == { "checkpoint": 3, "sharding": 3 }
+    assert chain.rolling_sum("blob_gas_used", 6) == 150
+    chain.modified_from["sharding"] = 7
+    assert chain.modified_from["checkpoint"] == 3
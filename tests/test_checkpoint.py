@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+from abm1559.checkpoint import Checkpointer, resume
+from abm1559.simulator import Simulation
+from abm1559.users import User1559, UserFloatingEsc
+
+class UserHurryEsc(UserFloatingEsc):
+    # Escalates from its cost per unit over 5 blocks
+    def decide_parameters(self, env):
+        return {
+            "start_block": self.wakeup_block,
+            "max_block": self.wakeup_block + 5,
+            "start_premium": self.cost_per_unit,
+            "max_fee": env["basefee"] + self.value // 2,
+            "basefee": env["basefee"],
+        }
+
+def make_simulation():
+    return Simulation([300] * 12, { User1559: 0.5, UserHurryEsc: 0.5 }, seed=42)
+
+def test_resume_continues_as_uninterrupted(tmp_path):
+    expected = make_simulation()
+    expected_metrics = pd.DataFrame(expected.run())
+
+    # Interrupted after 7 blocks, saving every 3
+    checkpointer = Checkpointer(str(tmp_path), every=3)
+    interrupted = make_simulation()
+    metrics = list(checkpointer.run(interrupted, blocks=7))
+    assert checkpointer.segments == 3
+
+    resumed = make_simulation()
+    checkpointer = resume(resumed, str(tmp_path), every=3)
+    assert resumed.t == 7
+    metrics += list(checkpointer.run(resumed))
+
+    pd.testing.assert_frame_equal(pd.DataFrame(metrics), expected_metrics)
+    pd.testing.assert_frame_equal(
+        resumed.chain.export().drop(columns=["tx"]),
+        expected.chain.export().drop(columns=["tx"]),
+    )
+    pd.testing.assert_frame_equal(
+        resumed.user_pool.export().drop(columns=["user"]),
+        expected.user_pool.export().drop(columns=["user"]),
+    )
+    assert sorted(resumed.txpool.txs) == sorted(expected.txpool.txs)
+
+class UserCounting(User1559):
+    # Balks from its fourth query on, so that its decisions depend on its state
+    def transact(self, env):
+        self.queries = getattr(self, "queries", 0) + 1
+        if self.queries > 3:
+            self.tx_hash = None
+            return None
+        return super().transact(env)
+
+def test_resume_restores_mutable_users(tmp_path):
+    make = lambda: Simulation([100] * 12, { UserCounting: 1 }, query_all=True, seed=3)
+    expected = make()
+    expected_metrics = pd.DataFrame(expected.run())
+
+    checkpointer = Checkpointer(str(tmp_path), every=3)
+    metrics = list(checkpointer.run(make(), blocks=7))
+    resumed = make()
+    checkpointer = resume(resumed, str(tmp_path), every=3)
+    metrics += list(checkpointer.run(resumed))
+
+    pd.testing.assert_frame_equal(pd.DataFrame(metrics), expected_metrics)
+    assert { pub_key: user.queries for pub_key, user in resumed.user_pool.users.items() } == \
+        { pub_key: user.queries for pub_key, user in expected.user_pool.users.items() }
+
+def test_save_refuses_existing_checkpoint(tmp_path):
+    list(Checkpointer(str(tmp_path)).run(make_simulation(), blocks=2))
+    with pytest.raises(FileExistsError):
+        Checkpointer(str(tmp_path)).save(make_simulation())
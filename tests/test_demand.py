@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from abm1559.demand import discounted_cumsum, poisson_process, jump_process, apply_block_time_variance
+
+def loop_jump_process(arrivals, duration, jump_mean, rng, discount):
+    # Loop of the simulator before the demand processes were vectorized
+    jp = []
+    current_jump = 0
+    for k in range(duration):
+        jumps = [int(t) for t in arrivals if int(t) == k]
+        for jump in jumps:
+            current_jump += rng.exponential(jump_mean)
+        jp += [current_jump]
+        current_jump *= (1-discount)
+    return np.array(jp)
+
+def loop_block_time_variance(demand_process, blocks, rng):
+    ia_times = rng.exponential(13, blocks)
+    demand_per_block = []
+    current_time = 0
+    for block_index, ia_time in enumerate(ia_times):
+        ia_time = int(ia_time)
+        new_demand = 0
+        for t in range(current_time, current_time + ia_time):
+            new_demand += demand_process[t]
+        demand_per_block += [int(new_demand)]
+        current_time += ia_time
+    return demand_per_block
+
+@pytest.mark.parametrize("discount", [0.0, 0.01, 0.3, 1.0])
+def test_discounted_cumsum_matches_loop(discount):
+    x = np.random.default_rng(0).exponential(size=5000)
+    expected, y = [], 2.0
+    for value in x:
+        y = value + (1 - discount) * y
+        expected.append(y)
+    assert np.allclose(discounted_cumsum(x, discount, initial=2.0), expected)
+
+def test_discounted_cumsum_rejects_discount_out_of_range():
+    for discount in [-0.1, 1.5]:
+        with pytest.raises(ValueError):
+            discounted_cumsum(np.ones(10), discount)
+
+@pytest.mark.parametrize("discount", [0.0, 0.05])
+def test_jump_process_matches_loop(discount):
+    # Both draw one jump per arrival, in the order of arrivals
+    arrivals = poisson_process(0.3, 500, rng=np.random.default_rng(0))
+    expected = loop_jump_process(arrivals, 500, 10, np.random.default_rng(1), discount)
+    assert np.allclose(jump_process(arrivals, 500, 10, rng=np.random.default_rng(1), discount=discount), expected)
+
+def test_poisson_process_arrivals():
+    arrivals = poisson_process(2.0, 10000, rng=np.random.default_rng(0))
+    assert np.all(np.diff(arrivals) > 0) and 0 <= arrivals[0] and arrivals[-1] < 10000
+    assert abs(len(arrivals) / 20000 - 1) < 0.05
+
+def test_block_time_variance_matches_loop():
+    demand = np.random.default_rng(0).integers(0, 100, size=3000).astype(float)
+    expected = loop_block_time_variance(demand, 100, np.random.default_rng(1))
+    assert apply_block_time_variance(demand, 100, rng=np.random.default_rng(1)).tolist() == expected
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from abm1559.export import RecordWriter, ChainWriter, UserWriter, read_export
+from abm1559.chain import Chain
+from abm1559.userpool import UserPool
+from abm1559.simulator import simulate
+from abm1559.users import User1559, UserFloatingEsc
+
+class UserHurryEsc(UserFloatingEsc):
+    # Escalates from its cost per unit over 5 blocks
+    def decide_parameters(self, env):
+        return {
+            "start_block": self.wakeup_block,
+            "max_block": self.wakeup_block + 5,
+            "start_premium": self.cost_per_unit,
+            "max_fee": env["basefee"] + self.value // 2,
+            "basefee": env["basefee"],
+        }
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_records_round_trip(tmp_path, format):
+    path = str(tmp_path / f"records.{format}")
+    records = [
+        { "a": 1, "b": None, "tx": object() },
+        { "a": 2, "c": "w" },
+        { "a": 3, "b": None, "c": "x" },
+        { "a": 4, "b": 1.5 },
+        { "a": 5, "b": 2.5, "c": None },
+    ]
+    with RecordWriter(path, format=format, buffer_size=2, types={ "b": "float64" }) as writer:
+        writer.write(records)
+        assert writer.rows_written == 4
+        with pytest.raises(ValueError):
+            writer.write([{ "a": 6, "d": 1 }])
+
+    df = read_export(path, format=format)
+    assert list(df.columns) == ["a", "b", "c"]
+    assert df["a"].tolist() == [1, 2, 3, 4, 5]
+    assert df["b"].tolist()[3:] == [1.5, 2.5]
+    assert df["b"].isna().tolist()[:3] == [True, True, True]
+    assert df["c"].tolist()[1:3] == ["w", "x"]
+
+def test_records_null_columns(tmp_path):
+    # Columns only null in the first records do not hold the buffer back
+    path = str(tmp_path / "records.parquet")
+    writer = RecordWriter(path, buffer_size=2)
+    writer.write([{ "a": i, "b": None } for i in range(4)])
+    assert writer.rows_written == 4
+    writer.write([{ "a": 4, "b": 1.5 }])
+    with pytest.raises(ValueError):
+        writer.close()
+
+    df = read_export(path)
+    assert df["a"].tolist() == [0, 1, 2, 3]
+    assert df["b"].isna().all()
+
+def test_simulation_exports_round_trip(tmp_path):
+    chain_path, users_path = str(tmp_path / "chain.parquet"), str(tmp_path / "users.parquet")
+    with ChainWriter(chain_path, buffer_size=100) as chain_writer, UserWriter(users_path, buffer_size=100) as user_writer:
+        _, user_pool, chain = simulate(
+            [200] * 5, { User1559: 0.5, UserHurryEsc: 0.5 },
+            chain = Chain(writer=chain_writer), user_pool = UserPool(writer=user_writer),
+            rng = np.random.default_rng(0),
+        )
+
+    for path, expected in [(chain_path, chain.export()), (users_path, user_pool.export())]:
+        df = read_export(path)
+        expected = expected.drop(columns=["tx", "user"], errors="ignore")
+        pd.testing.assert_frame_equal(df[expected.columns], expected, check_dtype=False)
+        # Columns of transaction and user types absent from the simulation
+        assert df.drop(columns=expected.columns).isna().all().all()
@@ -0,0 +1,42 @@
+import asyncio
+import numpy as np
+import pytest
+
+from abm1559.txs import Tx1559, TxFloatingEsc
+from abm1559.txpool import ColumnarTxPool
+from abm1559.live import LiveSimulation, QueueSource, decode_messages
+from abm1559.loadgen import LoadGenerator, QueueSink, encode_txs
+
+@pytest.mark.parametrize("sender", [7, b"\x01\x02\x03\x04\x05\x06\x07\x08"])
+def test_messages_round_trip(sender):
+    txs = [
+        Tx1559(sender, { "gas_premium": 10 ** 9, "max_fee": 2 * 10 ** 10, "start_block": 0 }, gas_used=50000),
+        TxFloatingEsc(sender, {
+            "start_block": 0, "max_block": 4, "start_premium": 10 ** 9,
+            "max_premium": 3 * 10 ** 9, "max_fee": 2 * 10 ** 10,
+        }),
+    ]
+    simulation = LiveSimulation(realtime=False)
+    decoded = [simulation.decode_tx(message) for message in decode_messages(encode_txs(txs, [0, 1], [0.0, 0.5]))]
+
+    for tx, decoded_tx in zip(txs, decoded):
+        assert type(decoded_tx) is type(tx)
+        assert decoded_tx.sender == sender
+        for field in ["gas_used", "start_block", "max_fee", "gas_premium", "start_premium", "max_premium", "max_block"]:
+            assert getattr(decoded_tx, field, None) == getattr(tx, field, None)
+
+def test_load_generator_feeds_columnar_pool():
+    async def run():
+        queue = asyncio.Queue(maxsize=1000)
+        simulation = LiveSimulation(block_time=0.1, realtime=False, txpool=ColumnarTxPool())
+        generator = LoadGenerator(rate=10000, batch_size=250, env=simulation.env, rng=np.random.default_rng(0))
+        task = asyncio.create_task(generator.run(QueueSink(queue), users=2000))
+        rows = [row async for row in simulation.live(QueueSource(queue))]
+        return simulation, await task, rows
+
+    simulation, summary, rows = asyncio.run(run())
+    assert summary["users"] == 2000
+    assert simulation.stats.rejected == 0
+    assert simulation.stats.inserted == summary["txs"] > 0
+    assert len(rows) > 0
+    assert simulation.stats.included + simulation.txpool.pool_length() == summary["txs"]
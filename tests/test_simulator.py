@@ -0,0 +1,77 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from abm1559.config import Config, BufferedGenerator
+from abm1559.utils import accepted_kwargs
+from abm1559.simulator import Simulation, update_basefee
+
+def test_accepted_kwargs():
+    def legacy(block, basefee):
+        pass
+
+    def keyword_only(block, basefee, *, config=None):
+        pass
+
+    def var_keyword(block, basefee, **kwargs):
+        pass
+
+    class Hook:
+        def update(self, block, basefee, config=None):
+            pass
+
+    kwargs = { "config": Config(), "rng": None }
+    assert accepted_kwargs(legacy, **kwargs) == {}
+    assert accepted_kwargs(keyword_only, **kwargs) == { "config": kwargs["config"] }
+    assert accepted_kwargs(var_keyword, **kwargs) == kwargs
+    assert accepted_kwargs(Hook().update, **kwargs) == { "config": kwargs["config"] }
+    assert accepted_kwargs(partial(keyword_only, None), **kwargs) == { "config": kwargs["config"] }
+    # Builtins without a signature get nothing
+    assert accepted_kwargs(max, **kwargs) == {}
+
+def test_simulation_passes_config_to_hooks_accepting_it():
+    config = Config(BASEFEE_MAX_CHANGE_DENOMINATOR=4)
+    calls = []
+
+    def legacy(block, basefee):
+        calls.append("legacy")
+        return update_basefee(block, basefee)
+
+    def configured(block, basefee, config=None):
+        calls.append(config)
+        return update_basefee(block, basefee, config=config)
+
+    rows = {}
+    for name, hook in [("legacy", legacy), ("configured", configured)]:
+        simulation = Simulation([100] * 5, basefee_update_fn=hook, config=config, rng=np.random.default_rng(0))
+        rows[name] = list(simulation.run())
+
+    assert calls == ["legacy"] * 5 + [config] * 5
+    # Only the hook receiving the config updates the basefee with its denominator
+    assert rows["legacy"][0]["basefee"] == rows["configured"][0]["basefee"]
+    assert rows["legacy"][1]["basefee"] != rows["configured"][1]["basefee"]
+
+def run_seeded(seed, tiebreak_rng=None):
+    simulation = Simulation([100] * 10, seed=seed)
+    if not tiebreak_rng is None:
+        simulation.tiebreak_rng = tiebreak_rng
+    rows = pd.DataFrame(simulation.run())
+    return rows, simulation.user_pool.export()
+
+def test_seeded_simulations_are_reproducible():
+    rows, users = run_seeded(3)
+    same_rows, same_users = run_seeded(3)
+    pd.testing.assert_frame_equal(rows, same_rows)
+    pd.testing.assert_frame_equal(users.drop(columns=["user"]), same_users.drop(columns=["user"]))
+    assert not run_seeded(4)[1]["value"].equals(users["value"])
+
+    # Breaking ties differently leaves the users unchanged
+    _, other_users = run_seeded(3, tiebreak_rng=np.random.default_rng(0))
+    pd.testing.assert_frame_equal(users.drop(columns=["user"]), other_users.drop(columns=["user"]))
+
+def test_buffered_generator_draws():
+    buffered = BufferedGenerator(0, size=16)
+    reference = np.random.default_rng(0)
+    assert [buffered.random() for _ in range(40)] == reference.random(16).tolist() + reference.random(16).tolist() + reference.random(16).tolist()[:8]
+    assert len(buffered.bytes(200)) == 200
@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+
+from abm1559.txs import Tx1559, TxFloatingEsc
+from abm1559.utils import constants
+from abm1559.builder import by_tip, pack
+from abm1559.txpool import (
+    TxPool,
+    IndexedTxPool,
+    GasPackingTxPool,
+    ColumnarTxPool,
+    EscalatorTxPool,
+    BoundedTxPool,
+)
+
+BASEFEE = 10 ** 9
+
+def make_txs(n, seed=0, gas_used=None):
+    # Premiums are even and fee caps odd above the basefee, so that no two valid transactions share a tip
+    rng = np.random.default_rng(seed)
+    premiums = 2 * rng.choice(10 ** 8, size=n, replace=False)
+    caps = 2 * rng.choice(10 ** 8, size=n, replace=False) + 1
+    below = rng.random(n) < 0.1
+    return [
+        Tx1559(
+            sender = rng.bytes(8),
+            tx_params = {
+                "gas_premium": int(premium),
+                "max_fee": BASEFEE - int(cap) if is_below else BASEFEE + int(cap),
+                "start_block": 0,
+            },
+            gas_used = 21000 if gas_used is None else int(gas_used[i]),
+            rng = rng,
+        ) for i, (premium, cap, is_below) in enumerate(zip(premiums, caps, below))
+    ]
+
+def hashes(txs):
+    return [tx.tx_hash for tx in txs]
+
+def select(txpool, env, seed=0):
+    return hashes(txpool.select_transactions(env, rng=np.random.default_rng(seed)))
+
+@pytest.mark.parametrize("PoolClass", [IndexedTxPool, ColumnarTxPool])
+def test_selection_matches_txpool(PoolClass):
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    txs = make_txs(3000)
+    reference, txpool = TxPool(), PoolClass()
+    reference.add_txs(txs)
+    txpool.add_txs(txs)
+
+    for basefee in [BASEFEE, BASEFEE // 2, 2 * BASEFEE]:
+        env["basefee"] = basefee
+        selected = select(reference, env)
+        assert select(txpool, env) == selected
+
+    reference.remove_txs(selected)
+    txpool.remove_txs(selected)
+    assert txpool.pool_length() == reference.pool_length()
+    assert select(txpool, env) == select(reference, env)
+
+def test_columnar_returns_transactions_as_added():
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    txs = make_txs(100)
+    txpool = ColumnarTxPool()
+    txpool.add_txs(txs)
+    added = { tx.tx_hash: tx for tx in txs }
+    assert all(added[tx.tx_hash] is tx for tx in txpool.select_transactions(env))
+
+def test_columnar_keeps_last_duplicate():
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    tx = make_txs(1)[0]
+    replacement = Tx1559(tx.sender, { "gas_premium": 3, "max_fee": 2 * BASEFEE, "start_block": 0 }, tx_hash=tx.tx_hash)
+    txpool = ColumnarTxPool()
+    txpool.add_txs([tx, replacement, tx, replacement])
+    assert txpool.pool_length() == 1
+    selected = txpool.select_transactions(env)
+    assert hashes(selected) == [tx.tx_hash]
+    assert selected[0].gas_premium == 3
+    txpool.remove_txs([tx.tx_hash])
+    assert txpool.pool_length() == 0
+
+def test_columnar_rejects_other_id_type():
+    txpool = ColumnarTxPool()
+    txpool.add_txs([])
+    txpool.add_txs(make_txs(2))
+    with pytest.raises(TypeError):
+        txpool.add_txs([Tx1559(1, { "gas_premium": 1, "max_fee": BASEFEE, "start_block": 0 }, tx_hash=2)])
+
+def test_bounded_selection_matches_txpool():
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    txs = make_txs(3000)
+    key = lambda tx: tx.tip(env)
+
+    # Under capacity, the bound changes nothing
+    reference, txpool = TxPool(), BoundedTxPool(capacity=len(txs))
+    reference.add_txs(txs)
+    assert txpool.add_txs(txs, env) == []
+    assert select(txpool, env) == select(reference, env)
+
+    # Over capacity, the pool keeps the transactions with the highest tips
+    capacity = 2000
+    kept = sorted(txs, key=key)[-capacity:]
+    reference, txpool = TxPool(), BoundedTxPool(capacity=capacity)
+    reference.add_txs(kept)
+    evicted = []
+    for start in range(0, len(txs), 500):
+        evicted += txpool.add_txs(txs[start:start + 500], env)
+    assert sorted(hashes(evicted)) == sorted(hashes(sorted(txs, key=key)[:-capacity]))
+    assert txpool.pool_length() == capacity
+    assert select(txpool, env) == select(reference, env)
+
+def test_gas_packing_matches_txpool():
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    gas_used = np.random.default_rng(1).integers(21000, 500000, size=3000)
+    txs = make_txs(3000, gas_used=gas_used)
+    reference, txpool = TxPool(), GasPackingTxPool()
+    reference.add_txs(txs)
+    txpool.add_txs(txs)
+
+    selected = hashes(pack(by_tip(reference.txs.values(), env)))
+    assert select(txpool, env) == selected
+    assert sum(tx.gas_used for tx in txpool.select_transactions(env)) <= constants["MAX_GAS_EIP1559"]
+
+def test_gas_packing_breaks_ties_uniformly():
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    txs = [Tx1559(i, { "gas_premium": 1, "max_fee": 2 * BASEFEE, "start_block": 0 }, tx_hash=i) for i in range(4)]
+    txpool = GasPackingTxPool()
+    txpool.add_txs(txs)
+
+    rng = np.random.default_rng(0)
+    first = np.zeros(len(txs))
+    for _ in range(4000):
+        order = [tx.tx_hash for _, tx in txpool.iter_by_tip(env, rng=rng)]
+        assert sorted(order) == list(range(len(txs)))
+        first[order[0]] += 1
+    assert np.all(np.abs(first / first.sum() - 1 / len(txs)) < 0.03)
+
+def make_escalators(n, seed=0):
+    rng = np.random.default_rng(seed)
+    txs = []
+    for _ in range(n):
+        start_block = int(rng.integers(0, 3))
+        start_premium = int(rng.integers(1, 10 ** 8))
+        txs.append(TxFloatingEsc(
+            sender = rng.bytes(8),
+            tx_params = {
+                "start_block": start_block,
+                "max_block": start_block + int(rng.integers(0, 5)),
+                "start_premium": start_premium,
+                "max_premium": start_premium + int(rng.integers(0, 10 ** 8)),
+                "max_fee": BASEFEE + int(rng.integers(-10 ** 8, 2 * 10 ** 8)),
+            },
+            rng = rng,
+        ))
+    return txs
+
+def test_escalator_selection_matches_txpool():
+    txs = make_txs(1500, seed=1) + make_escalators(1500, seed=2)
+    np.random.default_rng(3).shuffle(txs)
+    reference, txpool = TxPool(), EscalatorTxPool()
+    reference.add_txs(txs)
+    txpool.add_txs(txs, { "basefee": BASEFEE, "current_block": 0 })
+
+    for t in range(8):
+        env = { "basefee": BASEFEE, "current_block": t }
+        selected = select(reference, env)
+        assert select(txpool, env) == selected
+        reference.remove_txs(selected[:100])
+        txpool.remove_txs(selected[:100])
+
+def test_escalator_keeps_last_duplicate():
+    env = { "basefee": BASEFEE, "current_block": 0 }
+    tx = make_escalators(1)[0]
+    txpool = EscalatorTxPool()
+    txpool.add_txs([tx, tx], env)
+    assert txpool.pool_length() == 1
+    with pytest.raises(TypeError):
+        txpool.add_txs([Tx1559(1, { "gas_premium": 1, "max_fee": BASEFEE, "start_block": 0 }, tx_hash=2)], env)
+
+def test_bounded_without_env():
+    txs = make_txs(5)
+    with pytest.raises(ValueError):
+        BoundedTxPool(capacity=3).add_txs(txs)
+
+    # Policies not depending on the environment accept pools used as a TxPool
+    txpool = BoundedTxPool(capacity=3, policy="max_fee")
+    evicted = txpool.add_txs(txs)
+    assert sorted(hashes(evicted)) == sorted(hashes(sorted(txs, key=lambda tx: tx.max_fee)[:2]))
+    txpool.cancel_txs([next(iter(txpool.txs))], 1)
+    assert txpool.pool_length() == 3
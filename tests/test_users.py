@@ -0,0 +1,14 @@
+import numpy as np
+import pandas as pd
+
+from abm1559.users import User1559, UserFloatingEsc, UserBatch
+
+def test_batch_export_matches_user_export():
+    batch = UserBatch.spawn(3, { User1559: 20, UserFloatingEsc: 10 }, rng=np.random.default_rng(0))
+    expected = pd.DataFrame([user.export() for user in batch]).drop(columns=["user"])
+    pd.testing.assert_frame_equal(batch.export()[expected.columns], expected, check_dtype=False)
+
+def test_batch_users_created_once():
+    batch = UserBatch.spawn(0, { User1559: 5 }, rng=np.random.default_rng(0))
+    assert batch[2] is batch[2]
+    assert [user.pub_key for user in batch.materialize()] == [batch.pub_keys[8 * i:8 * (i+1)] for i in range(5)]